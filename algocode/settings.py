@@ -55,6 +55,7 @@ DEFAULT_COURSE = load_config("default_course")
 DEFAULT_PAGE = load_config("default_page")
 DEFAULT_HOME = load_config("default_home")
 MONGO = load_config('mongo_db')
+STANDINGS_STORE = load_config('standings_store')
 GOOGLE_SHEETS_CONFIG = load_secret('google_sheets_config')
 PCMS_STANDINGS = load_config('pcms_standings')
 
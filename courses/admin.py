@@ -315,6 +315,7 @@ class SheetsExportInline(admin.TabularInline):
         models.TextField: {'widget': Textarea(attrs={'rows': 1, 'cols': 40})},
     }
     model = StandingsSheetExport
+    exclude = ['last_pushed']
     extra = 0
 
 
@@ -554,6 +555,7 @@ class StandingsSheetExportAdmin(admin.ModelAdmin):
         models.TextField: {'widget': Textarea(attrs={'rows': 1, 'cols': 40})},
     }
     list_display = ['id', 'name', 'standings']
+    exclude = ['last_pushed']
 
 
 @admin.register(FormSheetsExport)
@@ -565,6 +567,26 @@ class FormSheetExportAdmin(admin.ModelAdmin):
     exclude = ['latest_id', 'latest_row']
 
 
+@admin.register(MailOutbox)
+class MailOutboxAdmin(admin.ModelAdmin):
+    formfield_overrides = {
+        models.TextField: {'widget': Textarea(attrs={'rows': 1, 'cols': 40})},
+    }
+    list_display = ['id', 'to', 'subject', 'status', 'attempts', 'time', 'sent_time']
+    list_filter = ['status']
+    raw_id_fields = ['entry']
+
+
+@admin.register(EjudgeRegisterRequest)
+class EjudgeRegisterRequestAdmin(admin.ModelAdmin):
+    formfield_overrides = {
+        models.TextField: {'widget': Textarea(attrs={'rows': 1, 'cols': 40})},
+    }
+    list_display = ['id', 'name', 'register_api', 'status', 'attempts', 'login', 'time', 'done_time']
+    list_filter = ['status']
+    raw_id_fields = ['entry']
+
+
 # Better hide it from admin page and show only for editing
 # @admin.register(MailAuth)
 # class MailAuthAdmin(admin.ModelAdmin):
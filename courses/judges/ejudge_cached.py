@@ -1,7 +1,7 @@
 from courses.judges.ejudge import *
 from courses.models import Contest, Participant
 from datetime import datetime, timezone, timedelta
-from courses.lib.mongo import mongo
+from courses.lib.store import store
 
 
 def load_ejudge_cached_contest(contest: Contest):
@@ -17,7 +17,7 @@ def load_ejudge_cached_contest(contest: Contest):
         contest.latest_reload_time = datetime.now(timezone.utc)
         contest.save()
 
-    cached = mongo.load_ejudge_cache(contest.id)
+    cached = store.load_cache(contest.id, cached=False)
     if cached is None:
         should_reload = True
 
@@ -25,7 +25,7 @@ def load_ejudge_cached_contest(contest: Contest):
 
     if not should_reload:
         try:
-            stored_standings = mongo.load_standings(contest.id)
+            stored_standings = store.load_standings(contest.id, cached=False)
             if len(stored_standings[0]) == 0:
                 should_reload = True
                 raise Exception("No stored standings")
@@ -155,12 +155,12 @@ def load_ejudge_cached_contest(contest: Contest):
     cached["problem_index"] = problem_index
     cached["latest_loaded_run"] = latest_loaded_run
 
-    if not mongo.upload_ejudge_cache(contest, cached):
-        print("Can not upload cached data to mongo")
+    if not store.upload_cache(contest, cached):
+        print("Can not upload cached data to standings store")
         return
 
-    if not mongo.upload_standings(contest, [problems, runs_list]):
-        print("Can not upload standings to mongo")
+    if not store.upload_standings(contest, [problems, runs_list]):
+        print("Can not upload standings to standings store")
         return
 
     print("Contest", contest.id, contest.title, "is loaded")
@@ -1,7 +1,7 @@
 import json
 
-from algocode import settings
-from courses.lib.mongo import mongo
+from courses.lib.store import store
+from courses.models import ContestStandingsHolder
 
 
 def load_from_db(contest):
@@ -15,18 +15,33 @@ def load_from_db(contest):
     except:
         pass
 
-    if mongo.upload_standings(contest, standings):
-        try:
-            contest.standings_holder.get().delete()
-        except:
-            pass
+    store.upload_standings(contest, standings)
 
     return standings
 
 
-def load_external_contest(contest):
-    if contest.standings_holder.count() > 0 or "connection_string" not in settings.MONGO:
+def load_external_contest(contest, users=None):
+    if contest.standings_holder.count() > 0 or not store.store_enabled():
         return load_from_db(contest)
-    else:
-        return mongo.load_standings(contest.id)
 
+    if users is not None:
+        standings = store.load_user_standings(contest.id, [user.id for user in users])
+        if standings is not None:
+            return standings
+    return store.load_standings(contest.id)
+
+
+def load_external_contests(contests):
+    with_holder = set(ContestStandingsHolder.objects.filter(contest__in=contests).values_list("contest_id", flat=True))
+    enabled = store.store_enabled()
+
+    result = dict()
+    stored = []
+    for contest in contests:
+        if contest.id in with_holder or not enabled:
+            result[contest.id] = load_from_db(contest)
+        else:
+            stored.append(contest.id)
+
+    result.update(store.load_standings_many(stored))
+    return result
@@ -3,10 +3,14 @@ from courses.judges.external import load_external_contest
 from courses.judges.process_contest import process_contest
 
 
-def load_contest(contest, users, **kwargs):
+def load_contest(contest, users, standings=None, user_runs=False, **kwargs):
     try:
         if contest.judge == contest.EJUDGE:
             problems, runs_list = load_ejudge_contest(contest, users)
+        elif standings is not None:
+            problems, runs_list = standings
+        elif user_runs:
+            problems, runs_list = load_external_contest(contest, users)
         else:
             problems, runs_list = load_external_contest(contest)
         return process_contest(runs_list, problems, contest, users, **kwargs)
@@ -7,11 +7,19 @@ from courses.models import Participant
 from courses.judges.common_verdicts import EJUDGE_OK, EJUDGE_WA
 
 
-def load_pcms_contest(c, users):
-    standings_file = os.path.join(PCMS_STANDINGS, c.external_group_id)
-    with open(standings_file) as standings_reader:
-        data = json.load(standings_reader)
+def get_standings_file(c):
+    return os.path.join(PCMS_STANDINGS, c.external_group_id)
+
+
+def get_login_users():
+    users = dict()
+    for pcms_login, user_id in Participant.objects.exclude(pcms_login='').values_list('pcms_login', 'id'):
+        users.setdefault(pcms_login, []).append(user_id)
+    return users
 
+
+def load_pcms_sessions(c, data, users):
+    # returns problems and runs of every session by its alias, users maps pcms login to participant ids
     contest = data["standings"]["contest"][0]
 
     problems = [{
@@ -23,13 +31,12 @@ def load_pcms_contest(c, users):
 
     problem_index = {problem['short']: problem['index'] for problem in problems}
 
-    runs_list = []
+    sessions = dict()
 
     for session in contest["session"]:
         user_login = session["alias"]
-        if user_login not in users:
-            users[user_login] = [participant.id for participant in Participant.objects.filter(pcms_login=user_login)]
-        for user_id in users[user_login]:
+        runs_list = sessions.setdefault(user_login, [])
+        for user_id in users.get(user_login, []):
             for problem in session["problem"]:
                 attempts = problem["attempts"]
                 if attempts == 0:
@@ -70,4 +77,17 @@ def load_pcms_contest(c, users):
                         'score': score,
                     })
 
+    return problems, sessions
+
+
+def load_pcms_contest(c, users=None):
+    if users is None:
+        users = get_login_users()
+    with open(get_standings_file(c)) as standings_reader:
+        data = json.load(standings_reader)
+
+    problems, sessions = load_pcms_sessions(c, data, users)
+    runs_list = []
+    for session_runs in sessions.values():
+        runs_list.extend(session_runs)
     return [problems, runs_list]
\ No newline at end of file
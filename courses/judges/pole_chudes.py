@@ -9,7 +9,7 @@ def recalc_pole_chudes_standings(game: PoleChudesGame):
     logger = logging.getLogger(__name__)
     teams = game.teams.order_by("id")
     users = list(Participant.objects.filter(pole_chudes_participants__team__in=teams))
-    contest = load_contest(game.contest, users, utc_time=True)
+    contest = load_contest(game.contest, users, utc_time=True, user_runs=True)
 
     for team in teams:
         let = []
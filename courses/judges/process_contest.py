@@ -37,6 +37,9 @@ def process_contest(runs_list, problems, contest, users, **kwargs):
                 if save_utc:
                     user_info[user.id][-1]["utc_time"] = 0
 
+    if hasattr(runs_list, 'for_users'):
+        runs_list = runs_list.for_users(user_ids)
+
     for run in runs_list:
         try:
             user_id = run['user_id']
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import random
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from courses.lib.ratelimit.token_bucket import TokenBucket
+
+STANDINGS_METHOD = 'contest.standings'
+STATUS_METHOD = 'contest.status'
+STANDINGS_FIXTURE = 'standings.json'
+STATUS_FIXTURE = 'status.json'
+SYNTHETIC_START_TIME = 1600000000
+SYNTHETIC_DURATION = 5 * 60 * 60
+SYNTHETIC_VERDICTS = ['OK', 'WRONG_ANSWER', 'TIME_LIMIT_EXCEEDED', 'RUNTIME_ERROR', 'COMPILATION_ERROR']
+
+
+def get_problem_index(i):
+    if i < 26:
+        return chr(ord('A') + i)
+    return 'P{}'.format(i + 1)
+
+
+def generate_contest(contest_id, submissions, participants, problems):
+    rng = random.Random(contest_id)
+    handles = ['user{}'.format(i) for i in range(participants)]
+    problem_list = [
+        {'contestId': contest_id, 'index': get_problem_index(i), 'name': 'Problem {}'.format(i + 1)}
+        for i in range(problems)
+    ]
+    standings = {
+        'status': 'OK',
+        'result': {
+            'contest': {
+                'id': contest_id,
+                'name': 'Synthetic contest {}'.format(contest_id),
+                'type': 'ICPC',
+                'phase': 'FINISHED',
+                'startTimeSeconds': SYNTHETIC_START_TIME,
+                'durationSeconds': SYNTHETIC_DURATION,
+            },
+            'problems': problem_list,
+            'rows': [
+                {'party': {'participantType': 'CONTESTANT', 'members': [{'handle': handle}]}}
+                for handle in handles
+            ],
+        }
+    }
+
+    status = []
+    for i in range(submissions):
+        status.append({
+            'id': i + 1,
+            'contestId': contest_id,
+            'creationTimeSeconds': SYNTHETIC_START_TIME + i * SYNTHETIC_DURATION // submissions,
+            'problem': rng.choice(problem_list),
+            'author': {
+                'participantType': 'CONTESTANT',
+                'startTimeSeconds': SYNTHETIC_START_TIME,
+                'members': [{'handle': rng.choice(handles)}],
+            },
+            'verdict': rng.choice(SYNTHETIC_VERDICTS),
+        })
+    # codeforces returns newest submissions first
+    status.reverse()
+    return standings, status
+
+
+class Fixtures:
+    """
+    Recorded api responses, <fixtures_dir>/<contest id>/standings.json is the whole contest.standings response,
+    status.json is list of all submissions of contest, newest first.
+    """
+
+    def __init__(self, fixtures_dir, synthetic=None):
+        self.fixtures_dir = fixtures_dir
+        self.synthetic = synthetic
+        self.status = dict()
+        self.synthetic_contests = dict()
+        self.lock = threading.Lock()
+
+    def get_path(self, contest_id, name):
+        return os.path.join(self.fixtures_dir, str(contest_id), name)
+
+    def get_synthetic(self, contest_id):
+        if self.synthetic is None or os.path.exists(os.path.join(self.fixtures_dir, str(contest_id))):
+            return None
+        with self.lock:
+            if contest_id not in self.synthetic_contests:
+                standings, status = generate_contest(contest_id, *self.synthetic)
+                self.synthetic_contests[contest_id] = (json.dumps(standings).encode('utf-8'), status)
+            return self.synthetic_contests[contest_id]
+
+    def get_standings(self, contest_id):
+        synthetic = self.get_synthetic(contest_id)
+        if synthetic is not None:
+            return synthetic[0]
+        try:
+            with open(self.get_path(contest_id, STANDINGS_FIXTURE), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get_status(self, contest_id):
+        synthetic = self.get_synthetic(contest_id)
+        if synthetic is not None:
+            return synthetic[1]
+        path = self.get_path(contest_id, STATUS_FIXTURE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            if contest_id not in self.status or self.status[contest_id][0] != mtime:
+                with open(path) as f:
+                    self.status[contest_id] = (mtime, json.load(f))
+            return self.status[contest_id][1]
+
+    def write(self, contest_id, name, data):
+        path = self.get_path(contest_id, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def record_standings(self, contest_id, body):
+        self.write(contest_id, STANDINGS_FIXTURE, body)
+
+    def record_status(self, contest_id, submissions):
+        # recorded pages are merged, so fixture contains every submission that was ever loaded
+        with self.lock:
+            path = self.get_path(contest_id, STATUS_FIXTURE)
+            try:
+                with open(path) as f:
+                    recorded = {submit['id']: submit for submit in json.load(f)}
+            except (OSError, ValueError):
+                recorded = dict()
+            for submit in submissions:
+                recorded[submit['id']] = submit
+            status = sorted(recorded.values(), key=lambda submit: -submit['id'])
+            self.write(contest_id, STATUS_FIXTURE, json.dumps(status).encode('utf-8'))
+            self.status.pop(contest_id, None)
+
+
+def failed(comment):
+    return json.dumps({'status': 'FAILED', 'comment': comment}).encode('utf-8')
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # server attributes: fixtures, latency, limiter, error_rate, upstream
+
+    def send_body(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        method = url.path.rstrip('/').rsplit('/', 1)[-1]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        if self.server.limiter is not None and not self.server.limiter.try_acquire():
+            self.send_body(503, failed('Call limit exceeded'))
+            return
+        if self.server.error_rate > 0 and random.random() < self.server.error_rate:
+            self.send_body(503, failed('Call limit exceeded'))
+            return
+
+        try:
+            contest_id = int(params['contestId'])
+        except (KeyError, ValueError):
+            self.send_body(400, failed('contestId: Field should contain contest id'))
+            return
+
+        if self.server.upstream is not None:
+            self.record(method, contest_id, url.query)
+        elif method == STANDINGS_METHOD:
+            self.replay_standings(contest_id)
+        elif method == STATUS_METHOD:
+            self.replay_status(contest_id, params)
+        else:
+            self.send_body(404, failed('Method not found'))
+
+    def replay_standings(self, contest_id):
+        body = self.server.fixtures.get_standings(contest_id)
+        if body is None:
+            self.send_body(400, failed('contestId: Contest with id {} not found'.format(contest_id)))
+            return
+        self.send_body(200, body)
+
+    def replay_status(self, contest_id, params):
+        status = self.server.fixtures.get_status(contest_id)
+        if status is None:
+            self.send_body(400, failed('contestId: Contest with id {} not found'.format(contest_id)))
+            return
+        first = max(int(params.get('from', 1)), 1) - 1
+        count = int(params.get('count', len(status)))
+        self.send_body(200, json.dumps({'status': 'OK', 'result': status[first:first + count]}).encode('utf-8'))
+
+    def record(self, method, contest_id, query):
+        response = requests.get('{}/{}?{}'.format(self.server.upstream, method, query))
+        body = response.content
+        try:
+            values = json.loads(body)
+            if values['status'] == 'OK' and method == STANDINGS_METHOD:
+                self.server.fixtures.record_standings(contest_id, body)
+            elif values['status'] == 'OK' and method == STATUS_METHOD:
+                self.server.fixtures.record_status(contest_id, values['result'])
+        except Exception as e:
+            print('Error, could not record {} of contest {}'.format(method, contest_id))
+            print(e)
+        self.send_body(response.status_code, body)
+
+
+def make_server(host, port, fixtures, latency=0, calls_per_second=None, error_rate=0, upstream=None):
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.fixtures = fixtures
+    server.latency = latency
+    server.limiter = TokenBucket(calls_per_second) if calls_per_second else None
+    server.error_rate = error_rate
+    server.upstream = upstream.rstrip('/') if upstream else None
+    return server
@@ -0,0 +1,198 @@
+import re
+import json
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from transliterate import translit
+
+from algocode.settings import EJUDGE_URL, EJUDGE_AUTH
+from courses.lib.mail.outbox import enqueue_mail
+from courses.models import Participant, EjudgeRegisterRequest
+
+from ejudge_registration.ejudge_api_registration import EjudgeApiSession
+
+REGISTER_BATCH_SIZE = 50
+REGISTER_MAX_ATTEMPTS = 3
+# delay before retry is doubled after every failed attempt
+REGISTER_RETRY_DELAY = 30
+# request taken by worker can be taken by another one after this time (if worker died)
+REGISTER_CLAIM_TIMEOUT = 10 * 60
+
+
+class ClaimLost(Exception):
+    pass
+
+
+def get_api_session():
+    return EjudgeApiSession(EJUDGE_AUTH["login"], EJUDGE_AUTH["password"], EJUDGE_URL)
+
+
+def create_ejudge_user(ejudge_register_api, name, api_session=None):
+    contests = [contest.contest_id for contest in ejudge_register_api.contests.all()]
+    login = ejudge_register_api.login
+    if api_session is None:
+        api_session = get_api_session()
+    int_login = True
+    if ejudge_register_api.use_surname:
+        surname = translit(name.split()[0], 'ru', reversed=True)
+        surname = re.sub(r'\W+', '', surname).lower()
+        login = f'{login}{surname}'
+        int_login = False
+    return api_session.create_user_and_add_contests(login, name, int_login, contests)
+
+
+def create_participants(ejudge_register_api, name, user, cf_login=None):
+    for group in ejudge_register_api.groups.all():
+        group_name = name
+        if group.use_login:
+            group_name = user["login"]
+        if cf_login is None:
+            Participant.objects.create(
+                name=group_name,
+                group=group.group,
+                course=group.group.course,
+                ejudge_id=user["user_id"],
+                pcms_login=user["login"],
+            )
+        else:
+            Participant.objects.create(
+                name=group_name,
+                group=group.group,
+                course=group.group.course,
+                ejudge_id=user["user_id"],
+                codeforces_handle=cf_login
+            )
+
+
+def register_user(ejudge_register_api, name, cf_login=None, api_session=None):
+    user = create_ejudge_user(ejudge_register_api, name, api_session)
+    create_participants(ejudge_register_api, name, user, cf_login)
+    return user
+
+
+def enqueue_registration(ejudge_register_api, name, cf_login=None, entry=None):
+    return EjudgeRegisterRequest.objects.create(register_api=ejudge_register_api, name=name, cf_login=cf_login, entry=entry)
+
+
+def get_registration_result(register_request):
+    # same keys as in user returned by register_user
+    return {
+        "login": register_request.login,
+        "password": register_request.password,
+        "user_id": register_request.user_id,
+    }
+
+
+def save_ejudge_user(register_request, user):
+    # saved before participants are created, so ejudge user is not created again on retry
+    register_request.login = user["login"]
+    register_request.password = user["password"]
+    register_request.user_id = user["user_id"]
+    register_request.save(update_fields=['login', 'password', 'user_id'])
+
+
+def save_registration(register_request, user):
+    register_request.status = EjudgeRegisterRequest.DONE
+    register_request.attempts += 1
+    register_request.error = ''
+    register_request.done_time = timezone.now()
+    register_request.save(update_fields=['status', 'attempts', 'error', 'done_time'])
+
+    entry = register_request.entry
+    if entry is None:
+        return
+    data = json.loads(entry.data)
+    data["ejudge_login"] = user["login"]
+    data["ejudge_password"] = user["password"]
+    data["ejudge_id"] = user["user_id"]
+    entry.data = json.dumps(data)
+    entry.save(update_fields=['data'])
+
+    # confirmation mail of async form is sent only when credentials are known
+    form = entry.form
+    if form.send_mail and form.mail_auth and entry.mail:
+        enqueue_mail(form.mail_auth, form.mail_topic, form.mail_template.format(**data), entry.mail, entry)
+
+
+def mark_failed(register_request, error, max_attempts, now):
+    register_request.attempts += 1
+    register_request.error = str(error)
+    if register_request.attempts >= max_attempts:
+        register_request.status = EjudgeRegisterRequest.FAILED
+    else:
+        register_request.status = EjudgeRegisterRequest.PENDING
+        register_request.next_attempt = now + datetime.timedelta(
+            seconds=REGISTER_RETRY_DELAY * 2 ** (register_request.attempts - 1)
+        )
+    register_request.save(update_fields=['attempts', 'error', 'status', 'next_attempt'])
+
+
+def claim(register_request, now):
+    # request is taken only if it was not changed by another worker since it was read
+    next_attempt = now + datetime.timedelta(seconds=REGISTER_CLAIM_TIMEOUT)
+    claimed = EjudgeRegisterRequest.objects.filter(
+        id=register_request.id,
+        status=register_request.status,
+        next_attempt=register_request.next_attempt,
+    ).update(status=EjudgeRegisterRequest.IN_PROGRESS, next_attempt=next_attempt)
+    if claimed != 1:
+        return False
+    register_request.status = EjudgeRegisterRequest.IN_PROGRESS
+    register_request.next_attempt = next_attempt
+    return True
+
+
+def renew_claim(register_request):
+    # claim is extended before every step, request taken by another worker after timeout is left to it
+    if not claim(register_request, timezone.now()):
+        raise ClaimLost()
+
+
+def process_pending(api_sessions, batch_size=REGISTER_BATCH_SIZE, max_attempts=REGISTER_MAX_ATTEMPTS):
+    # api_sessions keeps logged in session for every register api between calls
+    # returns number of processed requests and number of registered users
+    register_requests = list(
+        EjudgeRegisterRequest.objects
+        .filter(
+            status__in=[EjudgeRegisterRequest.PENDING, EjudgeRegisterRequest.IN_PROGRESS],
+            next_attempt__lte=timezone.now(),
+        )
+        .select_related('register_api', 'entry__form__mail_auth')
+        .prefetch_related('register_api__contests', 'register_api__groups__group__course')
+        .order_by('id')[:batch_size]
+    )
+    processed = 0
+    registered = 0
+    for register_request in register_requests:
+        if not claim(register_request, timezone.now()):
+            continue
+        processed += 1
+        api_id = register_request.register_api_id
+        try:
+            if register_request.user_id is None:
+                if api_id not in api_sessions:
+                    api_sessions[api_id] = get_api_session()
+                try:
+                    user = create_ejudge_user(register_request.register_api, register_request.name, api_sessions[api_id])
+                except:
+                    # session may be expired, it is created again for next request
+                    api_sessions.pop(api_id, None)
+                    raise
+                renew_claim(register_request)
+                save_ejudge_user(register_request, user)
+            user = get_registration_result(register_request)
+            with transaction.atomic():
+                # row stays locked by claim update until commit, so request can not be taken meanwhile
+                renew_claim(register_request)
+                create_participants(register_request.register_api, register_request.name, user, register_request.cf_login)
+                save_registration(register_request, user)
+        except ClaimLost:
+            print("Registration of {} was taken by another worker".format(register_request.name))
+            continue
+        except Exception as e:
+            print("Can not register {}, error:".format(register_request.name), e)
+            mark_failed(register_request, e, max_attempts, timezone.now())
+            continue
+        registered += 1
+    return processed, registered
@@ -0,0 +1,104 @@
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Prefetch, signals
+from django.dispatch import receiver
+
+from courses.lib.store.cache import LocalLRU, DEFAULT_LOCAL_CACHE_SIZE
+from courses.models import FormBuilder, FormField, FormFieldSelectOption, MailAuth, EjudgeRegisterApi
+
+FORM_SCHEMA_TIMEOUT = 60 * 60
+# any change of any form replaces generation, so schemas of all forms are built again
+GENERATION_KEY = "form_schema:generation"
+
+_local = LocalLRU(DEFAULT_LOCAL_CACHE_SIZE)
+
+
+def get_generation():
+    try:
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, uuid.uuid4().hex, None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+    except:
+        return None
+
+
+def invalidate_form_schemas():
+    try:
+        cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+    except:
+        pass
+
+
+def build_form_schema(form_label):
+    form = FormBuilder.objects.select_related('mail_auth').filter(label=form_label).first()
+    if form is None:
+        return None
+
+    fields = []
+    form_fields = FormField.objects.filter(form=form).order_by("id").prefetch_related(
+        Prefetch('select_options', queryset=FormFieldSelectOption.objects.order_by("id"))
+    )
+    for field in form_fields:
+        f = {
+            'id': field.id,
+            'label': field.label,
+            'type': field.type,
+            'required': field.required,
+            'internal_name': field.internal_name,
+            'description': field.description,
+        }
+        f.update(field.TYPES_DICT)
+        if field.type == FormField.SELECT:
+            f['options'] = [{'id': option.id, 'label': option.label} for option in field.select_options.all()]
+        fields.append(f)
+
+    register_apis = list(form.register_api.all())
+    return {
+        'form': form,
+        'fields': fields,
+        'register_api': register_apis[0] if len(register_apis) > 0 else None,
+    }
+
+
+def get_form_schema(form_label):
+    # returns None if there is no such form, schema must not be modified by callers
+    generation = get_generation()
+    if generation is None:
+        return build_form_schema(form_label)
+
+    key = "form_schema:{}:{}".format(generation, form_label)
+    schema = _local.get(key)
+    if schema is not None:
+        return schema
+    try:
+        schema = cache.get(key)
+    except:
+        schema = None
+    if schema is None:
+        schema = build_form_schema(form_label)
+        if schema is None:
+            return None
+        try:
+            cache.set(key, schema, FORM_SCHEMA_TIMEOUT)
+        except:
+            pass
+    _local.set(key, schema)
+    return schema
+
+
+@receiver(signals.post_save, sender=FormBuilder)
+@receiver(signals.post_delete, sender=FormBuilder)
+@receiver(signals.post_save, sender=FormField)
+@receiver(signals.post_delete, sender=FormField)
+@receiver(signals.post_save, sender=FormFieldSelectOption)
+@receiver(signals.post_delete, sender=FormFieldSelectOption)
+@receiver(signals.post_save, sender=MailAuth)
+@receiver(signals.post_delete, sender=MailAuth)
+@receiver(signals.post_save, sender=EjudgeRegisterApi)
+@receiver(signals.post_delete, sender=EjudgeRegisterApi)
+@receiver(signals.m2m_changed, sender=FormBuilder.register_api.through)
+def invalidate_on_change(sender, **kwargs):
+    invalidate_form_schemas()
@@ -1,7 +1,13 @@
+import csv
 import json
 
+from django.core.serializers.json import DjangoJSONEncoder
+
 from courses.models import FormBuilder, FormEntry
 
+# entries are read from database and sent to client by chunks of this size
+FORM_STREAM_CHUNK_SIZE = 1000
+
 
 def get_form_columns(form: FormBuilder):
     columns = ['time']
@@ -32,4 +38,48 @@ def get_form_entry_row(entry: FormEntry, column_names):
         else:
             row.append('')
 
-    return row
\ No newline at end of file
+    return row
+
+
+class EchoWriter:
+    # file-like object for csv.writer, writerow returns line instead of writing it
+    def write(self, value):
+        return value
+
+
+def get_form_entry_dict(entry: FormEntry):
+    entry_dict = json.loads(entry.data)
+    entry_dict["ip"] = entry.ip
+    entry_dict["time"] = entry.time.isoformat()
+    return entry_dict
+
+
+def iter_entry_chunks(form: FormBuilder):
+    chunk = []
+    for entry in form.entries.order_by("id").iterator(chunk_size=FORM_STREAM_CHUNK_SIZE):
+        chunk.append(entry)
+        if len(chunk) == FORM_STREAM_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def iter_form_csv(form: FormBuilder):
+    writer = csv.writer(EchoWriter())
+    columns, column_names = get_form_columns(form)
+    yield writer.writerow(columns)
+    for chunk in iter_entry_chunks(form):
+        yield ''.join(writer.writerow(get_form_entry_row(entry, column_names)) for entry in chunk)
+
+
+def iter_form_json(form: FormBuilder):
+    # json array is encoded by entries, the same as JsonResponse would encode whole list
+    encoder = DjangoJSONEncoder()
+    yield '['
+    first = True
+    for chunk in iter_entry_chunks(form):
+        parts = [encoder.encode(get_form_entry_dict(entry)) for entry in chunk]
+        yield ('' if first else ', ') + ', '.join(parts)
+        first = False
+    yield ']'
@@ -0,0 +1,117 @@
+import datetime
+
+from django.core import mail
+from django.utils import timezone
+
+from courses.models import MailOutbox
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+# delay before retry is doubled after every failed attempt
+OUTBOX_RETRY_DELAY = 60
+# mail taken by sender can be taken by another one after this time (if sender died)
+OUTBOX_CLAIM_TIMEOUT = 10 * 60
+
+
+def enqueue_mail(auth, subject, body, to, entry=None):
+    return MailOutbox.objects.create(mail_auth=auth, subject=subject, body=body, to=to, entry=entry)
+
+
+def get_connection(auth):
+    return mail.get_connection(
+        host=auth.mail_host,
+        port=auth.mail_port,
+        username=auth.mail_username,
+        password=auth.mail_password,
+        use_tls=auth.mail_use_tls,
+        use_ssl=auth.mail_use_ssl
+    )
+
+
+def mark_failed(message, error, max_attempts, now):
+    message.attempts += 1
+    message.error = str(error)
+    if message.attempts >= max_attempts:
+        message.status = MailOutbox.FAILED
+    else:
+        message.status = MailOutbox.PENDING
+        message.next_attempt = now + datetime.timedelta(seconds=OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1))
+    message.save(update_fields=['attempts', 'error', 'status', 'next_attempt'])
+
+
+def send_messages(auth, messages, max_attempts):
+    # one smtp connection for all messages of the same mail auth
+    sent = 0
+    connection = get_connection(auth)
+    try:
+        connection.open()
+    except Exception as e:
+        print("Can not connect to mail server {}, error:".format(auth), e)
+        for message in messages:
+            mark_failed(message, e, max_attempts, timezone.now())
+        return sent
+
+    try:
+        for message in messages:
+            # claim of whole batch may expire while previous messages are sent, so it is extended for every one
+            if not claim(message, timezone.now()):
+                print("Mail {} was taken by another sender".format(message.id))
+                continue
+            try:
+                mail.EmailMessage(
+                    message.subject,
+                    message.body,
+                    auth.mail_username,
+                    [message.to],
+                    connection=connection
+                ).send()
+            except Exception as e:
+                print("Can not send mail {}, error:".format(message.id), e)
+                mark_failed(message, e, max_attempts, timezone.now())
+                # server may have dropped connection after error
+                connection.close()
+                continue
+            message.status = MailOutbox.SENT
+            message.attempts += 1
+            message.error = ''
+            message.sent_time = timezone.now()
+            message.save(update_fields=['status', 'attempts', 'error', 'sent_time'])
+            sent += 1
+    finally:
+        connection.close()
+    return sent
+
+
+def claim(message, now):
+    # mail is taken only if it was not changed by another sender since it was read
+    next_attempt = now + datetime.timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+    claimed = MailOutbox.objects.filter(
+        id=message.id,
+        status=message.status,
+        next_attempt=message.next_attempt,
+    ).update(status=MailOutbox.SENDING, next_attempt=next_attempt)
+    if claimed != 1:
+        return False
+    message.status = MailOutbox.SENDING
+    message.next_attempt = next_attempt
+    return True
+
+
+def send_pending(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    # returns number of processed messages and number of sent ones
+    messages = list(
+        MailOutbox.objects
+        .filter(status__in=[MailOutbox.PENDING, MailOutbox.SENDING], next_attempt__lte=timezone.now())
+        .select_related('mail_auth')
+        .order_by('id')[:batch_size]
+    )
+    # whole batch is taken before sending
+    now = timezone.now()
+    messages = [message for message in messages if claim(message, now)]
+    auths_messages = dict()
+    for message in messages:
+        auths_messages.setdefault(message.mail_auth_id, []).append(message)
+    sent = 0
+    for auth_messages in auths_messages.values():
+        sent += send_messages(auth_messages[0].mail_auth, auth_messages, max_attempts)
+    return len(messages), sent
@@ -0,0 +1,155 @@
+import hashlib
+import multiprocessing
+import resource
+import signal
+import threading
+
+# limits for one mark_func call, memory is counted on top of worker process own memory
+MARK_FUNC_TIMEOUT = 5
+MARK_FUNC_MEMORY = 256 * 1024 * 1024
+MARK_WORKERS = 2
+
+# compiled mark functions of worker process by source hash
+_compiled = dict()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class MarkFuncTimeout(Exception):
+    pass
+
+
+def get_source_hash(source):
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def get_code(source_hash, source):
+    if source_hash not in _compiled:
+        _compiled[source_hash] = compile(source, '<mark_func>', 'exec')
+    return _compiled[source_hash]
+
+
+def raise_timeout(signum, frame):
+    raise MarkFuncTimeout()
+
+
+def init_worker(memory_limit):
+    signal.signal(signal.SIGALRM, raise_timeout)
+    try:
+        with open('/proc/self/statm') as statm:
+            size = int(statm.read().split()[0]) * resource.getpagesize()
+        resource.setrlimit(resource.RLIMIT_AS, (size + memory_limit, size + memory_limit))
+    except:
+        pass
+
+
+def get_error(e):
+    return "{}: {}".format(type(e).__name__, e)
+
+
+def run_marks(source_hash, source, batch, timeout):
+    # runs in worker process, batch is list of mark_func globals (user_scores is required),
+    # returns (marks, None) or (None, error) for every call
+    try:
+        code = get_code(source_hash, source)
+    except BaseException as e:
+        return [(None, get_error(e))] * len(batch)
+
+    result = []
+    for mark_globals in batch:
+        ldict = {}
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                exec(code, mark_globals, ldict)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            marks = list(ldict["marks"])
+            if len(marks) != len(mark_globals['user_scores']):
+                raise ValueError("{} marks for {} users".format(len(marks), len(mark_globals['user_scores'])))
+        except BaseException as e:
+            result.append((None, get_error(e)))
+            continue
+        result.append((marks, None))
+    return result
+
+
+class MarkPool:
+    """
+    Worker processes for mark_func of sheet exports.
+
+    A call is interrupted after timeout seconds inside worker. If worker does not answer at all
+    (for example it hangs in native code), the pool is terminated and created again.
+    """
+
+    def __init__(self, workers=MARK_WORKERS, timeout=MARK_FUNC_TIMEOUT, memory_limit=MARK_FUNC_MEMORY):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.pool = None
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                # workers don't need django, spawn is safe to use from multithreaded process
+                self.pool = multiprocessing.get_context('spawn').Pool(
+                    self.workers,
+                    initializer=init_worker,
+                    initargs=(self.memory_limit,),
+                )
+            return self.pool, self.generation
+
+    def reset(self, generation):
+        # returns False if pool was already replaced by another call
+        with self.lock:
+            if generation != self.generation:
+                return False
+            if self.pool is not None:
+                self.pool.terminate()
+            self.pool = None
+            self.generation += 1
+            return True
+
+    def calc_marks(self, source, batch):
+        if len(batch) == 0:
+            return []
+        source_hash = get_source_hash(source)
+        while True:
+            pool, generation = self.get_pool()
+            result = pool.apply_async(run_marks, (source_hash, source, batch, self.timeout))
+            try:
+                return result.get(self.timeout * len(batch) + 1)
+            except multiprocessing.TimeoutError:
+                if self.reset(generation):
+                    return [(None, "worker did not answer")] * len(batch)
+            except Exception as e:
+                return [(None, get_error(e))] * len(batch)
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MarkPool()
+        return _pool
+
+
+def calc_marks(source, batch):
+    # returns (marks, error) for every mark_func globals of batch, marks are None if mark_func failed
+    return get_pool().calc_marks(source, batch)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,77 @@
+import re
+import time
+import threading
+from collections import deque
+
+from courses.lib.sheets.service import SheetsService, SheetsTemporaryError
+
+CELL_RE = re.compile(r'^([A-Z]+)([0-9]+)$')
+
+
+def get_column_index(column_id):
+    index = 0
+    for c in column_id:
+        index = index * 26 + ord(c) - ord('A') + 1
+    return index - 1
+
+
+def parse_range(value_range):
+    # "Tab!B2:D5" -> ("Tab", 1, 1), only top left cell is needed to write values
+    tab, cells = value_range.rsplit('!', 1)
+    match = CELL_RE.match(cells.split(':')[0])
+    if match is None:
+        raise ValueError('Unsupported range {}'.format(value_range))
+    return tab, int(match.group(2)) - 1, get_column_index(match.group(1))
+
+
+class FakeSheetsService(SheetsService):
+    """
+    In-process sheets api for benchmarks, keeps written cells and every request.
+
+    quota is number of calls allowed in any minute (None for no limit), latency is added to every call.
+    """
+
+    def __init__(self, quota=None, latency=0):
+        self.quota = quota
+        self.latency = latency
+        self.calls = deque()
+        self.requests = []
+        self.rejected = 0
+        self.updated_cells = 0
+        self.grids = dict()
+        self.lock = threading.Lock()
+
+    def batch_update(self, spreadsheet_id, data):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with self.lock:
+            now = time.monotonic()
+            if self.quota is not None:
+                while len(self.calls) > 0 and self.calls[0] <= now - 60:
+                    self.calls.popleft()
+                if len(self.calls) >= self.quota:
+                    self.rejected += 1
+                    raise SheetsTemporaryError('Quota exceeded')
+                self.calls.append(now)
+
+            self.requests.append((spreadsheet_id, data))
+            updated_cells = 0
+            for value_range in data:
+                tab, first_row, first_column = parse_range(value_range["range"])
+                grid = self.grids.setdefault((spreadsheet_id, tab), dict())
+                for i, row in enumerate(value_range["values"]):
+                    for j, value in enumerate(row):
+                        grid[(first_row + i, first_column + j)] = value
+                        updated_cells += 1
+            self.updated_cells += updated_cells
+            return {"spreadsheetId": spreadsheet_id, "totalUpdatedCells": updated_cells}
+
+    def dump(self, spreadsheet_id, tab):
+        with self.lock:
+            grid = self.grids.get((spreadsheet_id, tab), dict())
+            if len(grid) == 0:
+                return []
+            rows = max(row for row, column in grid) + 1
+            columns = max(column for row, column in grid) + 1
+            return [[grid.get((i, j), '') for j in range(columns)] for i in range(rows)]
@@ -0,0 +1,43 @@
+from apiclient import discovery
+from googleapiclient.errors import HttpError
+from google.oauth2 import service_account
+
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/spreadsheets"]
+# quota exceeded and temporary server errors, such calls can be retried
+SHEETS_TEMPORARY_STATUSES = (429, 500, 503)
+
+
+class SheetsTemporaryError(Exception):
+    pass
+
+
+class SheetsService:
+    """
+    Part of Google Sheets api used by exports.
+
+    data of batch_update is list of {"range": "Tab!A1:C3", "values": rows}, values are written with USER_ENTERED option.
+    Calls rejected because of quota raise SheetsTemporaryError.
+    """
+
+    def batch_update(self, spreadsheet_id, data):
+        raise NotImplementedError
+
+
+class GoogleSheetsService(SheetsService):
+    def __init__(self, config):
+        credentials = service_account.Credentials.from_service_account_info(config, scopes=SHEETS_SCOPES)
+        self.service = discovery.build('sheets', 'v4', credentials=credentials)
+
+    def batch_update(self, spreadsheet_id, data):
+        try:
+            return self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={
+                    "valueInputOption": 'USER_ENTERED',
+                    "data": data,
+                }
+            ).execute()
+        except HttpError as e:
+            if e.resp.status in SHEETS_TEMPORARY_STATUSES:
+                raise SheetsTemporaryError(str(e))
+            raise
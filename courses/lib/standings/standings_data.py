@@ -1,3 +1,4 @@
+from courses.judges.external import load_external_contests
 from courses.judges.judges import load_contest
 from courses.models import Standings, Contest
 
@@ -16,10 +17,13 @@ def get_standings_data(standings: Standings):
 
     contests_models = standings.contests.filter(contest_id__isnull=False)
     contests_models |= standings.contests.filter(judge=Contest.PCMS)
-    contests_models = contests_models.order_by('-date', '-id')
+    contests_models = list(contests_models.order_by('-date', '-id'))
+    external_standings = load_external_contests([
+        contest_model for contest_model in contests_models if contest_model.judge != Contest.EJUDGE
+    ])
     contests = []
     for contest_model in contests_models:
-        contest = load_contest(contest_model, users)
+        contest = load_contest(contest_model, users, standings=external_standings.get(contest_model.id))
         if contest is None:
             continue
 
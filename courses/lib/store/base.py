@@ -0,0 +1,67 @@
+def group_runs_by_user(runs_list):
+    user_runs = dict()
+    for run in runs_list:
+        user_runs.setdefault(run['user_id'], []).append(run)
+    return user_runs
+
+
+class StandingsStore:
+    """
+    Storage for loaded contest data.
+
+    Standings are stored as [problems, runs_list] per contest id, cache is a json-like dict
+    with loader state (see ejudge_cached). Every upload of standings or cache bumps contest version.
+    With user_runs enabled runs are also stored per participant, so few participants can be loaded
+    without loading whole contest.
+    """
+
+    def __init__(self, user_runs=False):
+        self.user_runs = user_runs
+
+    def enabled(self):
+        raise NotImplementedError
+
+    def upload_standings(self, contest_id, standings):
+        raise NotImplementedError
+
+    def upload_standings_many(self, standings_by_id):
+        raise NotImplementedError
+
+    def append_runs(self, contest_id, runs_list):
+        raise NotImplementedError
+
+    def delete_standings_many(self, contest_ids):
+        # removes standings and loader cache, version is kept and bumped so cached copies are never used again
+        raise NotImplementedError
+
+    def load_standings(self, contest_id):
+        raise NotImplementedError
+
+    def load_standings_many(self, contest_ids):
+        raise NotImplementedError
+
+    def load_user_standings(self, contest_id, user_ids):
+        # returns None if contest has no per participant runs
+        raise NotImplementedError
+
+    def upload_cache(self, contest_id, data):
+        raise NotImplementedError
+
+    def upload_caches(self, data_by_id):
+        raise NotImplementedError
+
+    def load_cache(self, contest_id):
+        raise NotImplementedError
+
+    def load_caches(self, contest_ids):
+        raise NotImplementedError
+
+    def get_version(self, contest_id):
+        raise NotImplementedError
+
+    def get_versions(self, contest_ids):
+        raise NotImplementedError
+
+    def get_cache_version(self, contest_id):
+        # loader cache has its own version, so loader cache updates keep cached standings valid
+        raise NotImplementedError
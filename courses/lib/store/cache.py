@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+DEFAULT_LOCAL_CACHE_SIZE = 64
+DEFAULT_SHARED_CACHE_TIMEOUT = 60 * 60
+
+
+class LocalLRU:
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+
+class VersionedCache:
+    """
+    Two-tier cache (in-process LRU and django cache) for data that is identified by contest id and its version.
+
+    Values must not be modified by callers, they are shared between requests.
+    """
+
+    def __init__(self, local_size=DEFAULT_LOCAL_CACHE_SIZE, shared_timeout=DEFAULT_SHARED_CACHE_TIMEOUT):
+        self.local = LocalLRU(local_size)
+        self.shared_timeout = shared_timeout
+
+    def get_key(self, kind, contest_id, version):
+        return "standings_store:{}:{}:{}".format(kind, contest_id, version)
+
+    def get(self, kind, contest_id, version):
+        if version is None:
+            return None
+        key = self.get_key(kind, contest_id, version)
+
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        try:
+            value = cache.get(key)
+        except:
+            value = None
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, kind, contest_id, version, value):
+        if version is None:
+            return
+        key = self.get_key(kind, contest_id, version)
+        self.local.set(key, value)
+        try:
+            cache.set(key, value, self.shared_timeout)
+        except:
+            pass
@@ -0,0 +1,20 @@
+import os
+import fcntl
+from contextlib import contextmanager, ExitStack
+
+from algocode import settings
+
+LOCKS_DIR = os.path.join(settings.BASE_DIR, 'judges_data', 'locks')
+
+
+@contextmanager
+def contests_lock(contest_ids):
+    # incremental load (read cache, append runs, upload cache) of the same contest must not overlap,
+    # another loader waits until lock is released
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    with ExitStack() as stack:
+        # same order in every loader, so loaders locking several contests do not deadlock
+        for contest_id in sorted(set(contest_ids)):
+            lock_file = stack.enter_context(open(os.path.join(LOCKS_DIR, '{}.lock'.format(contest_id)), 'w'))
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
@@ -0,0 +1,183 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+MAPPED_MAGIC = b"ALGR"
+MAPPED_FORMAT_VERSION = 1
+# magic, format version, contest version, runs count, problems json length
+MAPPED_HEADER = struct.Struct("<4sIqQI")
+# user_id, status, time, utc_time, prob_id, score
+MAPPED_RUN = struct.Struct("<q2sddid")
+MAPPED_STATUS_SIZE = 2
+
+_opened = dict()
+_opened_lock = threading.Lock()
+
+
+def get_mapped_path(mapped_dir, contest_id):
+    return os.path.join(mapped_dir, "{}.runs".format(contest_id))
+
+
+def number_value(value):
+    if value.is_integer():
+        return int(value)
+    return value
+
+
+def run_from_record(record):
+    return {
+        'user_id': record[0],
+        'status': record[1].rstrip(b'\x00').decode('ascii'),
+        'time': number_value(record[2]),
+        'utc_time': number_value(record[3]),
+        'prob_id': record[4],
+        'score': number_value(record[5]),
+    }
+
+
+class MappedRuns:
+    """
+    Read-only sequence of runs backed by a memory-mapped file.
+
+    Records are decoded only while iterating, the file itself is shared between processes through page cache.
+    """
+
+    def __init__(self, view, count):
+        self.view = view
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("run index out of range")
+        return run_from_record(MAPPED_RUN.unpack_from(self.view, index * MAPPED_RUN.size))
+
+    def __iter__(self):
+        for record in MAPPED_RUN.iter_unpack(self.view):
+            yield run_from_record(record)
+
+    def for_users(self, user_ids):
+        for record in MAPPED_RUN.iter_unpack(self.view):
+            if record[0] in user_ids:
+                yield run_from_record(record)
+
+    def raw(self):
+        return self.view
+
+
+class MappedStandings:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, self.version, count, problems_size = MAPPED_HEADER.unpack_from(self.buffer, 0)
+        if magic != MAPPED_MAGIC or format_version != MAPPED_FORMAT_VERSION:
+            raise ValueError("Wrong mapped standings file {}".format(path))
+        runs_offset = MAPPED_HEADER.size + problems_size
+        self.problems = json.loads(self.buffer[MAPPED_HEADER.size:runs_offset].decode('utf-8'))
+        view = memoryview(self.buffer)[runs_offset:runs_offset + count * MAPPED_RUN.size]
+        self.runs = MappedRuns(view, count)
+
+    def standings(self):
+        return [self.problems, self.runs]
+
+
+def write_mapped(path, problems, records, count, version):
+    problems_data = json.dumps(problems).encode('utf-8')
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAPPED_HEADER.pack(MAPPED_MAGIC, MAPPED_FORMAT_VERSION, version, count, len(problems_data)))
+            f.write(problems_data)
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def pack_status(status):
+    # status is padded with zero bytes by struct, longer one would be truncated, so file is not written
+    data = status.encode('ascii')
+    if len(data) > MAPPED_STATUS_SIZE or b'\x00' in data:
+        raise ValueError("Status {} can not be mapped".format(status))
+    return data
+
+
+def pack_runs(runs_list):
+    for run in runs_list:
+        yield MAPPED_RUN.pack(
+            run['user_id'],
+            pack_status(run['status']),
+            run['time'],
+            run['utc_time'],
+            run['prob_id'],
+            run['score'],
+        )
+
+
+def upload_mapped(mapped_dir, contest_id, standings, version):
+    try:
+        write_mapped(get_mapped_path(mapped_dir, contest_id), standings[0], pack_runs(standings[1]), len(standings[1]), version)
+        return True
+    except:
+        remove_mapped(mapped_dir, contest_id)
+        return False
+
+
+def append_mapped(mapped_dir, contest_id, runs_list, old_version, version):
+    mapped = load_mapped(mapped_dir, contest_id)
+    if mapped is None or mapped.version != old_version:
+        remove_mapped(mapped_dir, contest_id)
+        return False
+    try:
+        records = [mapped.runs.raw()]
+        records.extend(pack_runs(runs_list))
+        write_mapped(get_mapped_path(mapped_dir, contest_id), mapped.problems, records, len(mapped.runs) + len(runs_list), version)
+        return True
+    except:
+        remove_mapped(mapped_dir, contest_id)
+        return False
+
+
+def remove_mapped(mapped_dir, contest_id):
+    try:
+        os.remove(get_mapped_path(mapped_dir, contest_id))
+    except OSError:
+        pass
+
+
+def load_mapped(mapped_dir, contest_id):
+    path = get_mapped_path(mapped_dir, contest_id)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    with _opened_lock:
+        opened = _opened.get(path)
+        if opened is not None and opened[0] == key:
+            return opened[1]
+
+    try:
+        mapped = MappedStandings(path)
+    except:
+        return None
+
+    with _opened_lock:
+        _opened[path] = (key, mapped)
+    return mapped
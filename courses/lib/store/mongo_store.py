@@ -0,0 +1,276 @@
+import pymongo
+
+from courses.lib.mongo import mongo
+from courses.lib.mongo.mongo import RUNS_BATCH_SIZE, upload_run_list, load_run_list
+from courses.lib.store.base import StandingsStore, group_runs_by_user
+
+
+class MongoStore(StandingsStore):
+    def __init__(self, user_runs=False):
+        super().__init__(user_runs)
+        self.db = None
+
+    def get_db(self):
+        if self.db is None:
+            self.db = mongo.get_db()
+        return self.db
+
+    def enabled(self):
+        return mongo.mongo_enabled()
+
+    def bump_version(self, db, contest_id, collection="versions"):
+        db[collection].update_one({"id": contest_id}, {"$inc": {"version": 1}}, True)
+        db[collection].create_index("id")
+
+    def bump_versions(self, db, contest_ids, collection="versions"):
+        db[collection].bulk_write([
+            pymongo.UpdateOne({"id": contest_id}, {"$inc": {"version": 1}}, upsert=True) for contest_id in contest_ids
+        ])
+        db[collection].create_index("id")
+
+    def upload_user_runs(self, db, contest_id, runs_list):
+        collection = db["standings_user_runs"]
+        collection.delete_many({"id": contest_id})
+        user_runs = group_runs_by_user(runs_list)
+        if len(user_runs) > 0:
+            collection.insert_many([
+                {"id": contest_id, "user_id": user_id, "runs": runs}
+                for user_id, runs in user_runs.items()
+            ])
+        collection.create_index([("id", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)])
+        db["standings"].update_one({"id": contest_id}, {"$set": {"user_runs": True}})
+
+    def append_user_runs(self, db, contest_id, runs_list):
+        db["standings_user_runs"].bulk_write([
+            pymongo.UpdateOne({"id": contest_id, "user_id": user_id}, {"$push": {"runs": {"$each": runs}}}, upsert=True)
+            for user_id, runs in group_runs_by_user(runs_list).items()
+        ])
+
+    def upload_standings(self, contest_id, standings):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+
+            runs_list = standings[1]
+            if len(runs_list) > RUNS_BATCH_SIZE:
+                upload_run_list(db["standings_runs"], contest_id, runs_list)
+                standings = standings[:1]
+            else:
+                db["standings_runs"].delete_many({"id": contest_id})
+
+            db["standings"].update_one({"id": contest_id}, {"$set": {"standings": standings, "user_runs": False}}, True)
+            db["standings"].create_index("id")
+            if self.user_runs:
+                self.upload_user_runs(db, contest_id, runs_list)
+            self.bump_version(db, contest_id)
+            return True
+        except:
+            return False
+
+    def upload_standings_many(self, standings_by_id):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+
+            small = dict()
+            for contest_id, standings in standings_by_id.items():
+                if len(standings[1]) > RUNS_BATCH_SIZE:
+                    if not self.upload_standings(contest_id, standings):
+                        return False
+                else:
+                    small[contest_id] = standings
+            if len(small) == 0:
+                return True
+
+            db["standings_runs"].delete_many({"id": {"$in": list(small)}})
+            db["standings"].bulk_write([
+                pymongo.UpdateOne({"id": contest_id}, {"$set": {"standings": standings, "user_runs": False}}, upsert=True)
+                for contest_id, standings in small.items()
+            ])
+            db["standings"].create_index("id")
+            if self.user_runs:
+                for contest_id, standings in small.items():
+                    self.upload_user_runs(db, contest_id, standings[1])
+            self.bump_versions(db, list(small))
+            return True
+        except:
+            return False
+
+    def append_runs(self, contest_id, runs_list):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+
+            holder = db["standings"].find_one({"id": contest_id})
+            if holder is None:
+                return False
+            standings = holder["standings"]
+
+            if len(standings) == 2 and len(standings[1]) + len(runs_list) <= RUNS_BATCH_SIZE:
+                db["standings"].update_one({"id": contest_id}, {"$push": {"standings.1": {"$each": runs_list}}})
+            elif len(standings) == 2:
+                upload_run_list(db["standings_runs"], contest_id, standings[1] + runs_list)
+                db["standings"].update_one({"id": contest_id}, {"$set": {"standings": standings[:1]}})
+            else:
+                last_batch = db["standings_runs"].find_one({"id": contest_id}, sort=[("batch", pymongo.DESCENDING)])
+                if last_batch is None:
+                    upload_run_list(db["standings_runs"], contest_id, runs_list)
+                else:
+                    upload_run_list(db["standings_runs"], contest_id, last_batch["runs"] + runs_list, last_batch["batch"])
+
+            if self.user_runs and holder.get("user_runs", False) and len(runs_list) > 0:
+                self.append_user_runs(db, contest_id, runs_list)
+            self.bump_version(db, contest_id)
+            return True
+        except:
+            return False
+
+    def delete_standings_many(self, contest_ids):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+            contest_ids = list(contest_ids)
+            if len(contest_ids) == 0:
+                return True
+            for collection in ["standings", "standings_runs", "standings_user_runs", "ejudge_cache"]:
+                db[collection].delete_many({"id": {"$in": contest_ids}})
+            self.bump_versions(db, contest_ids)
+            self.bump_versions(db, contest_ids, "cache_versions")
+            return True
+        except:
+            return False
+
+    def load_standings(self, contest_id):
+        try:
+            db = self.get_db()
+            standings = db["standings"].find_one({"id": contest_id})
+            if standings is None:
+                return [[], []]
+            else:
+                result = standings["standings"]
+                if len(result) == 1:
+                    result.append(load_run_list(db["standings_runs"], contest_id))
+                return result
+        except:
+            return [[], []]
+
+    def load_standings_many(self, contest_ids):
+        result = {contest_id: [[], []] for contest_id in contest_ids}
+        try:
+            db = self.get_db()
+            batched = []
+            for standings in db["standings"].find({"id": {"$in": list(contest_ids)}}):
+                result[standings["id"]] = standings["standings"]
+                if len(standings["standings"]) == 1:
+                    standings["standings"].append([])
+                    batched.append(standings["id"])
+
+            if len(batched) > 0:
+                batches = db["standings_runs"].find(
+                    filter={"id": {"$in": batched}},
+                    sort=[("id", pymongo.ASCENDING), ("batch", pymongo.ASCENDING)]
+                )
+                for batch in batches:
+                    result[batch["id"]][1].extend(batch["runs"])
+            return result
+        except:
+            return {contest_id: [[], []] for contest_id in contest_ids}
+
+    def load_user_standings(self, contest_id, user_ids):
+        try:
+            db = self.get_db()
+            holder = db["standings"].find_one({"id": contest_id}, {"standings": {"$slice": 1}, "user_runs": True})
+            if holder is None:
+                return [[], []]
+            if not holder.get("user_runs", False):
+                return None
+            runs_list = []
+            for user_runs in db["standings_user_runs"].find({"id": contest_id, "user_id": {"$in": list(user_ids)}}):
+                runs_list.extend(user_runs["runs"])
+            return [holder["standings"][0], runs_list]
+        except:
+            return None
+
+    def upload_cache(self, contest_id, data):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+            db["ejudge_cache"].update_one({"id": contest_id}, {"$set": {"data": data}}, True)
+            db["ejudge_cache"].create_index("id")
+            self.bump_version(db, contest_id, "cache_versions")
+            return True
+        except:
+            return False
+
+    def upload_caches(self, data_by_id):
+        try:
+            db = self.get_db()
+            if db is None:
+                return False
+            if len(data_by_id) == 0:
+                return True
+            db["ejudge_cache"].bulk_write([
+                pymongo.UpdateOne({"id": contest_id}, {"$set": {"data": data}}, upsert=True)
+                for contest_id, data in data_by_id.items()
+            ])
+            db["ejudge_cache"].create_index("id")
+            self.bump_versions(db, list(data_by_id), "cache_versions")
+            return True
+        except:
+            return False
+
+    def load_cache(self, contest_id):
+        try:
+            db = self.get_db()
+            data_holder = db["ejudge_cache"].find_one({"id": contest_id})
+            if data_holder is None:
+                return dict()
+            else:
+                return data_holder["data"]
+        except:
+            return dict()
+
+    def load_caches(self, contest_ids):
+        result = {contest_id: dict() for contest_id in contest_ids}
+        try:
+            db = self.get_db()
+            for data_holder in db["ejudge_cache"].find({"id": {"$in": list(contest_ids)}}):
+                result[data_holder["id"]] = data_holder["data"]
+            return result
+        except:
+            return {contest_id: dict() for contest_id in contest_ids}
+
+    def get_version(self, contest_id):
+        try:
+            db = self.get_db()
+            version = db["versions"].find_one({"id": contest_id})
+            if version is None:
+                return 0
+            return version["version"]
+        except:
+            return None
+
+    def get_cache_version(self, contest_id):
+        try:
+            db = self.get_db()
+            version = db["cache_versions"].find_one({"id": contest_id})
+            if version is None:
+                return 0
+            return version["version"]
+        except:
+            return None
+
+    def get_versions(self, contest_ids):
+        try:
+            db = self.get_db()
+            versions = {contest_id: 0 for contest_id in contest_ids}
+            for version in db["versions"].find({"id": {"$in": list(contest_ids)}}):
+                versions[version["id"]] = version["version"]
+            return versions
+        except:
+            return {contest_id: None for contest_id in contest_ids}
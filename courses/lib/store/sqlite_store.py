@@ -0,0 +1,260 @@
+import json
+import os
+import sqlite3
+import threading
+
+from courses.lib.mongo.mongo import RUNS_BATCH_SIZE
+from courses.lib.store.base import StandingsStore, group_runs_by_user
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS standings (id INTEGER PRIMARY KEY, problems TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS standings_runs (id INTEGER NOT NULL, batch INTEGER NOT NULL, runs TEXT NOT NULL, PRIMARY KEY (id, batch));
+CREATE TABLE IF NOT EXISTS loader_cache (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS versions (id INTEGER PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS cache_versions (id INTEGER PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS standings_user_runs (id INTEGER NOT NULL, user_id INTEGER NOT NULL, runs TEXT NOT NULL, PRIMARY KEY (id, user_id));
+CREATE TABLE IF NOT EXISTS user_runs_contests (id INTEGER PRIMARY KEY);
+'''
+
+
+class SqliteStore(StandingsStore):
+    def __init__(self, path, user_runs=False):
+        super().__init__(user_runs)
+        self.path = path
+        self.local = threading.local()
+
+    def get_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SQLITE_SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def enabled(self):
+        return True
+
+    def bump_version(self, connection, contest_id, table="versions"):
+        connection.execute(
+            "INSERT INTO {} (id, version) VALUES (?, 1) ON CONFLICT(id) DO UPDATE SET version = version + 1".format(table),
+            (contest_id,)
+        )
+
+    def insert_runs(self, connection, contest_id, runs_list, first_batch):
+        connection.executemany(
+            "INSERT OR REPLACE INTO standings_runs (id, batch, runs) VALUES (?, ?, ?)",
+            [
+                (contest_id, first_batch + i, json.dumps(runs_list[start:start + RUNS_BATCH_SIZE]))
+                for i, start in enumerate(range(0, len(runs_list), RUNS_BATCH_SIZE))
+            ]
+        )
+
+    def upload_user_runs(self, connection, contest_id, runs_list):
+        connection.execute("DELETE FROM standings_user_runs WHERE id = ?", (contest_id,))
+        connection.executemany(
+            "INSERT INTO standings_user_runs (id, user_id, runs) VALUES (?, ?, ?)",
+            [(contest_id, user_id, json.dumps(runs)) for user_id, runs in group_runs_by_user(runs_list).items()]
+        )
+        connection.execute("INSERT OR IGNORE INTO user_runs_contests (id) VALUES (?)", (contest_id,))
+
+    def append_user_runs(self, connection, contest_id, runs_list):
+        for user_id, runs in group_runs_by_user(runs_list).items():
+            stored = connection.execute(
+                "SELECT runs FROM standings_user_runs WHERE id = ? AND user_id = ?",
+                (contest_id, user_id)
+            ).fetchone()
+            if stored is not None:
+                runs = json.loads(stored[0]) + runs
+            connection.execute(
+                "INSERT OR REPLACE INTO standings_user_runs (id, user_id, runs) VALUES (?, ?, ?)",
+                (contest_id, user_id, json.dumps(runs))
+            )
+
+    def has_user_runs(self, connection, contest_id):
+        return connection.execute("SELECT 1 FROM user_runs_contests WHERE id = ?", (contest_id,)).fetchone() is not None
+
+    def write_standings(self, connection, contest_id, standings):
+        connection.execute(
+            "INSERT OR REPLACE INTO standings (id, problems) VALUES (?, ?)",
+            (contest_id, json.dumps(standings[0]))
+        )
+        connection.execute("DELETE FROM standings_runs WHERE id = ?", (contest_id,))
+        self.insert_runs(connection, contest_id, standings[1], 0)
+        if self.user_runs:
+            self.upload_user_runs(connection, contest_id, standings[1])
+        else:
+            connection.execute("DELETE FROM user_runs_contests WHERE id = ?", (contest_id,))
+            connection.execute("DELETE FROM standings_user_runs WHERE id = ?", (contest_id,))
+        self.bump_version(connection, contest_id)
+
+    def upload_standings(self, contest_id, standings):
+        try:
+            with self.get_connection() as connection:
+                self.write_standings(connection, contest_id, standings)
+            return True
+        except:
+            return False
+
+    def upload_standings_many(self, standings_by_id):
+        try:
+            with self.get_connection() as connection:
+                for contest_id, standings in standings_by_id.items():
+                    self.write_standings(connection, contest_id, standings)
+            return True
+        except:
+            return False
+
+    def append_runs(self, contest_id, runs_list):
+        try:
+            with self.get_connection() as connection:
+                if connection.execute("SELECT 1 FROM standings WHERE id = ?", (contest_id,)).fetchone() is None:
+                    return False
+                last_batch = connection.execute(
+                    "SELECT MAX(batch) FROM standings_runs WHERE id = ?",
+                    (contest_id,)
+                ).fetchone()[0]
+                self.insert_runs(connection, contest_id, runs_list, 0 if last_batch is None else last_batch + 1)
+                if self.user_runs and self.has_user_runs(connection, contest_id):
+                    self.append_user_runs(connection, contest_id, runs_list)
+                self.bump_version(connection, contest_id)
+            return True
+        except:
+            return False
+
+    def delete_standings_many(self, contest_ids):
+        try:
+            with self.get_connection() as connection:
+                for contest_id in contest_ids:
+                    for table in ["standings", "standings_runs", "standings_user_runs", "user_runs_contests", "loader_cache"]:
+                        connection.execute("DELETE FROM {} WHERE id = ?".format(table), (contest_id,))
+                    self.bump_version(connection, contest_id)
+                    self.bump_version(connection, contest_id, "cache_versions")
+            return True
+        except:
+            return False
+
+    def load_standings(self, contest_id):
+        try:
+            connection = self.get_connection()
+            problems = connection.execute("SELECT problems FROM standings WHERE id = ?", (contest_id,)).fetchone()
+            if problems is None:
+                return [[], []]
+            runs_list = []
+            for batch in connection.execute("SELECT runs FROM standings_runs WHERE id = ? ORDER BY batch", (contest_id,)):
+                runs_list.extend(json.loads(batch[0]))
+            return [json.loads(problems[0]), runs_list]
+        except:
+            return [[], []]
+
+    def load_standings_many(self, contest_ids):
+        result = {contest_id: [[], []] for contest_id in contest_ids}
+        try:
+            contest_ids = list(contest_ids)
+            connection = self.get_connection()
+            placeholders = ", ".join("?" * len(contest_ids))
+            query = "SELECT id, problems FROM standings WHERE id IN ({})".format(placeholders)
+            for contest_id, problems in connection.execute(query, contest_ids):
+                result[contest_id] = [json.loads(problems), []]
+            query = "SELECT id, runs FROM standings_runs WHERE id IN ({}) ORDER BY id, batch".format(placeholders)
+            for contest_id, runs in connection.execute(query, contest_ids):
+                result[contest_id][1].extend(json.loads(runs))
+            return result
+        except:
+            return {contest_id: [[], []] for contest_id in contest_ids}
+
+    def load_user_standings(self, contest_id, user_ids):
+        try:
+            connection = self.get_connection()
+            problems = connection.execute("SELECT problems FROM standings WHERE id = ?", (contest_id,)).fetchone()
+            if problems is None:
+                return [[], []]
+            if not self.has_user_runs(connection, contest_id):
+                return None
+            user_ids = list(user_ids)
+            query = "SELECT runs FROM standings_user_runs WHERE id = ? AND user_id IN ({})".format(", ".join("?" * len(user_ids)))
+            runs_list = []
+            for runs in connection.execute(query, [contest_id] + user_ids):
+                runs_list.extend(json.loads(runs[0]))
+            return [json.loads(problems[0]), runs_list]
+        except:
+            return None
+
+    def upload_cache(self, contest_id, data):
+        try:
+            with self.get_connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO loader_cache (id, data) VALUES (?, ?)",
+                    (contest_id, json.dumps(data))
+                )
+                self.bump_version(connection, contest_id, "cache_versions")
+            return True
+        except:
+            return False
+
+    def upload_caches(self, data_by_id):
+        try:
+            with self.get_connection() as connection:
+                for contest_id, data in data_by_id.items():
+                    connection.execute(
+                        "INSERT OR REPLACE INTO loader_cache (id, data) VALUES (?, ?)",
+                        (contest_id, json.dumps(data))
+                    )
+                    self.bump_version(connection, contest_id, "cache_versions")
+            return True
+        except:
+            return False
+
+    def load_cache(self, contest_id):
+        try:
+            data = self.get_connection().execute("SELECT data FROM loader_cache WHERE id = ?", (contest_id,)).fetchone()
+            if data is None:
+                return dict()
+            return json.loads(data[0])
+        except:
+            return dict()
+
+    def load_caches(self, contest_ids):
+        result = {contest_id: dict() for contest_id in contest_ids}
+        try:
+            contest_ids = list(contest_ids)
+            query = "SELECT id, data FROM loader_cache WHERE id IN ({})".format(", ".join("?" * len(contest_ids)))
+            for contest_id, data in self.get_connection().execute(query, contest_ids):
+                result[contest_id] = json.loads(data)
+            return result
+        except:
+            return {contest_id: dict() for contest_id in contest_ids}
+
+    def get_version(self, contest_id):
+        try:
+            version = self.get_connection().execute("SELECT version FROM versions WHERE id = ?", (contest_id,)).fetchone()
+            if version is None:
+                return 0
+            return version[0]
+        except:
+            return None
+
+    def get_cache_version(self, contest_id):
+        try:
+            version = self.get_connection().execute(
+                "SELECT version FROM cache_versions WHERE id = ?",
+                (contest_id,)
+            ).fetchone()
+            if version is None:
+                return 0
+            return version[0]
+        except:
+            return None
+
+    def get_versions(self, contest_ids):
+        try:
+            contest_ids = list(contest_ids)
+            versions = {contest_id: 0 for contest_id in contest_ids}
+            query = "SELECT id, version FROM versions WHERE id IN ({})".format(", ".join("?" * len(contest_ids)))
+            for contest_id, version in self.get_connection().execute(query, contest_ids):
+                versions[contest_id] = version
+            return versions
+        except:
+            return {contest_id: None for contest_id in contest_ids}
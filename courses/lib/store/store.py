@@ -0,0 +1,224 @@
+import os
+
+from algocode import settings
+from courses.lib.store import mapped
+from courses.lib.store.cache import VersionedCache, DEFAULT_LOCAL_CACHE_SIZE, DEFAULT_SHARED_CACHE_TIMEOUT
+from courses.lib.store.mongo_store import MongoStore
+from courses.lib.store.sqlite_store import SqliteStore
+
+MONGO_BACKEND = "mongo"
+SQLITE_BACKEND = "sqlite"
+
+STANDINGS_CACHE = "standings"
+LOADER_CACHE = "cache"
+
+_store = None
+_cache = None
+
+
+def get_store_config():
+    config = settings.STANDINGS_STORE
+    if config is None:
+        config = dict()
+    return config
+
+
+def get_store():
+    global _store
+    if _store is None:
+        config = get_store_config()
+        backend = config.get("backend", MONGO_BACKEND)
+        if backend == SQLITE_BACKEND:
+            _store = SqliteStore(
+                config.get("path", os.path.join(settings.BASE_DIR, 'judges_data', 'standings.sqlite3')),
+                config.get("user_runs", False),
+            )
+        else:
+            _store = MongoStore(config.get("user_runs", False))
+    return _store
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        config = get_store_config()
+        _cache = VersionedCache(
+            config.get("local_cache_size", DEFAULT_LOCAL_CACHE_SIZE),
+            config.get("shared_cache_timeout", DEFAULT_SHARED_CACHE_TIMEOUT),
+        )
+    return _cache
+
+
+def get_mapped_dir():
+    return get_store_config().get("mapped_dir")
+
+
+def store_enabled():
+    return get_store().enabled()
+
+
+def delete_standings_holder(contest):
+    try:
+        if contest.standings_holder.count() != 0:
+            contest.standings_holder.get().delete()
+    except:
+        pass
+
+
+def upload_mapped_standings(mapped_dir, contest_id, standings, version):
+    if version is None or not mapped.upload_mapped(mapped_dir, contest_id, standings, version):
+        mapped.remove_mapped(mapped_dir, contest_id)
+
+
+def upload_standings(contest, standings):
+    if not get_store().upload_standings(contest.id, standings):
+        return False
+    delete_standings_holder(contest)
+
+    mapped_dir = get_mapped_dir()
+    if mapped_dir:
+        upload_mapped_standings(mapped_dir, contest.id, standings, get_version(contest.id))
+    return True
+
+
+def upload_standings_many(contests_standings):
+    # contests_standings is list of (contest, standings)
+    if len(contests_standings) == 0:
+        return True
+    if not get_store().upload_standings_many({contest.id: standings for contest, standings in contests_standings}):
+        return False
+
+    mapped_dir = get_mapped_dir()
+    versions = get_versions([contest.id for contest, standings in contests_standings]) if mapped_dir else dict()
+    for contest, standings in contests_standings:
+        delete_standings_holder(contest)
+        if mapped_dir:
+            upload_mapped_standings(mapped_dir, contest.id, standings, versions[contest.id])
+    return True
+
+
+def append_runs(contest, runs_list):
+    mapped_dir = get_mapped_dir()
+    old_version = get_version(contest.id) if mapped_dir else None
+
+    if not get_store().append_runs(contest.id, runs_list):
+        return False
+
+    if mapped_dir:
+        version = get_version(contest.id)
+        if old_version is None or version is None:
+            mapped.remove_mapped(mapped_dir, contest.id)
+        else:
+            mapped.append_mapped(mapped_dir, contest.id, runs_list, old_version, version)
+    return True
+
+
+def delete_standings_many(contest_ids):
+    if len(contest_ids) == 0:
+        return True
+    deleted = get_store().delete_standings_many(contest_ids)
+    mapped_dir = get_mapped_dir()
+    if mapped_dir:
+        for contest_id in contest_ids:
+            mapped.remove_mapped(mapped_dir, contest_id)
+    return deleted
+
+
+def load_standings(contest_id, cached=True):
+    # cached standings are shared between requests and must not be modified, loaders should use cached=False
+    if not cached:
+        return get_store().load_standings(contest_id)
+    return load_standings_version(contest_id, get_version(contest_id))
+
+
+def get_cached_standings(contest_id, version):
+    mapped_dir = get_mapped_dir()
+    if mapped_dir:
+        mapped_standings = mapped.load_mapped(mapped_dir, contest_id)
+        if mapped_standings is not None and (version is None or mapped_standings.version == version):
+            return mapped_standings.standings()
+    return get_cache().get(STANDINGS_CACHE, contest_id, version)
+
+
+def cache_standings(contest_id, version, standings):
+    if version is None or len(standings[0]) == 0:
+        return
+    mapped_dir = get_mapped_dir()
+    if not mapped_dir or not mapped.upload_mapped(mapped_dir, contest_id, standings, version):
+        get_cache().set(STANDINGS_CACHE, contest_id, version, standings)
+
+
+def load_standings_version(contest_id, version):
+    standings = get_cached_standings(contest_id, version)
+    if standings is None:
+        standings = get_store().load_standings(contest_id)
+        cache_standings(contest_id, version, standings)
+    return standings
+
+
+def load_standings_many(contest_ids):
+    if len(contest_ids) == 0:
+        return dict()
+    versions = get_versions(contest_ids)
+    result = dict()
+    missing = []
+    for contest_id in contest_ids:
+        standings = get_cached_standings(contest_id, versions[contest_id])
+        if standings is None:
+            missing.append(contest_id)
+        else:
+            result[contest_id] = standings
+
+    if len(missing) > 0:
+        for contest_id, standings in get_store().load_standings_many(missing).items():
+            cache_standings(contest_id, versions[contest_id], standings)
+            result[contest_id] = standings
+    return result
+
+
+def load_user_standings(contest_id, user_ids):
+    # without per participant runs caller uses cached standings of whole contest
+    standings_store = get_store()
+    if not standings_store.user_runs:
+        return None
+    return standings_store.load_user_standings(contest_id, user_ids)
+
+
+def upload_cache(contest, data):
+    return get_store().upload_cache(contest.id, data)
+
+
+def upload_caches(contests_data):
+    # contests_data is list of (contest, data)
+    return get_store().upload_caches({contest.id: data for contest, data in contests_data})
+
+
+def load_cache(contest_id, cached=True):
+    if not cached:
+        return get_store().load_cache(contest_id)
+
+    version = get_cache_version(contest_id)
+    data = get_cache().get(LOADER_CACHE, contest_id, version)
+    if data is None:
+        data = get_store().load_cache(contest_id)
+        get_cache().set(LOADER_CACHE, contest_id, version, data)
+    return data
+
+
+def load_caches(contest_ids):
+    # loaders only, data is not cached
+    if len(contest_ids) == 0:
+        return dict()
+    return get_store().load_caches(contest_ids)
+
+
+def get_version(contest_id):
+    return get_store().get_version(contest_id)
+
+
+def get_versions(contest_ids):
+    return get_store().get_versions(contest_ids)
+
+
+def get_cache_version(contest_id):
+    return get_store().get_cache_version(contest_id)
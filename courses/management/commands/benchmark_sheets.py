@@ -0,0 +1,176 @@
+import json
+import time
+import uuid
+import random
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from courses.lib.marks.marks import close_pool
+from courses.lib.sheets.fake import FakeSheetsService
+from courses.lib.store import store
+from courses.management.commands.sync_sheets import get_sync_tasks, run_sync, set_api_quota, SHEETS_API_QUOTA, \
+    SHEETS_WORKERS
+from courses.models import Course, ParticipantsGroup, Participant, Contest, ContestStandingsHolder, Standings, \
+    StandingsSheetExport, FormBuilder, FormField, FormEntry, FormSheetsExport
+
+SYNTHETIC_GROUPS = 4
+SYNTHETIC_FORM_FIELDS = 6
+SYNTHETIC_VERDICTS = ['OK', 'WA', 'TL', 'RT']
+
+
+def create_standings(course, groups, contests_count, problems_count, runs_per_user, rng):
+    participant_ids = list(Participant.objects.filter(course=course).values_list('id', flat=True))
+    standings = Standings.objects.create(course=course, title=course.title, label='{}_{}'.format(course.label, uuid.uuid4().hex[:8]))
+    standings.groups.set(groups)
+
+    holders = []
+    for i in range(contests_count):
+        contest = Contest.objects.create(
+            course=course,
+            date=datetime.date.today() - datetime.timedelta(days=i),
+            title='Contest {}'.format(i + 1),
+            judge=Contest.CODEFORCES,
+            contest_id=i + 1,
+        )
+        standings.contests.add(contest)
+
+        problems = [{
+            'id': j + 1,
+            'long': 'Problem {}'.format(j + 1),
+            'short': chr(ord('A') + j % 26),
+            'index': j,
+        } for j in range(problems_count)]
+        runs_list = []
+        for user_id in participant_ids:
+            for k in range(runs_per_user):
+                status = rng.choice(SYNTHETIC_VERDICTS)
+                runs_list.append({
+                    'user_id': user_id,
+                    'status': status,
+                    'time': k * 60,
+                    'utc_time': k * 60,
+                    'prob_id': rng.randrange(problems_count),
+                    'score': 1 if status == 'OK' else 0,
+                })
+        holders.append(ContestStandingsHolder(
+            contest=contest,
+            problems=json.dumps(problems),
+            runs_list=json.dumps(runs_list),
+        ))
+    ContestStandingsHolder.objects.bulk_create(holders)
+    return standings
+
+
+def create_form(label, entries_count):
+    form = FormBuilder.objects.create(label=label, title=label)
+    FormField.objects.bulk_create([
+        FormField(form=form, label='Field {}'.format(i + 1), internal_name='field{}'.format(i + 1))
+        for i in range(SYNTHETIC_FORM_FIELDS)
+    ])
+    FormEntry.objects.bulk_create([
+        FormEntry(form=form, data=json.dumps({
+            'field{}'.format(j + 1): 'value {} {}'.format(i, j) for j in range(SYNTHETIC_FORM_FIELDS)
+        }))
+        for i in range(entries_count)
+    ])
+    return form
+
+
+class Command(BaseCommand):
+    help = 'Runs sheets sync with synthetic standings against in-process sheets api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--standings', type=int, default=2, help='Number of synthetic standings')
+        parser.add_argument('--exports', type=int, default=2, help='Number of sheet exports for every standings')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--contests', type=int, default=20)
+        parser.add_argument('--problems', type=int, default=8)
+        parser.add_argument('--runs', type=int, default=10, help='Number of runs of every user in every contest')
+        parser.add_argument('--forms', type=int, default=1, help='Number of synthetic forms with sheet export')
+        parser.add_argument('--entries', type=int, default=1000, help='Number of entries of every form')
+        parser.add_argument('--calculate-mark', action='store_true', help='Calculate marks in standings exports')
+        parser.add_argument('--latency', type=float, default=0.3, help='Delay of every sheets api call in seconds')
+        parser.add_argument('--quota', type=int, default=SHEETS_API_QUOTA, help='Sheets api calls per minute')
+        parser.add_argument('--workers', type=int, default=SHEETS_WORKERS)
+        parser.add_argument('--dump', action='store_true', help='Print grid of the first standings export')
+
+    def handle(self, *args, **options):
+        # synthetic data is created in transaction that is rolled back, so it is never seen by sync_sheets cron,
+        # sync workers share connection of this transaction
+        contest_ids = []
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.inc_thread_sharing()
+        try:
+            with transaction.atomic():
+                try:
+                    self.run_benchmark(options, connection, contest_ids)
+                finally:
+                    transaction.set_rollback(True)
+        finally:
+            connection.dec_thread_sharing()
+            close_pool()
+            set_api_quota(SHEETS_API_QUOTA)
+            # synthetic contests are uploaded to standings store by the first sync, their ids are free again after rollback
+            if store.store_enabled() and not store.delete_standings_many(contest_ids):
+                print("Can not delete synthetic contests from standings store")
+
+    def run_benchmark(self, options, connection, contest_ids):
+        rng = random.Random(0)
+        label = 'sheets_benchmark_{}'.format(uuid.uuid4().hex[:8])
+        course = Course.objects.create(label=label, title=label)
+        groups = [
+            ParticipantsGroup.objects.create(course=course, name='Group {}'.format(i + 1), short_name=str(i + 1))
+            for i in range(SYNTHETIC_GROUPS)
+        ]
+        Participant.objects.bulk_create([
+            Participant(name='User {}'.format(i + 1), group=groups[i % len(groups)], course=course)
+            for i in range(options['users'])
+        ])
+
+        for i in range(options['standings']):
+            standings = create_standings(
+                course, groups, options['contests'], options['problems'], options['runs'], rng
+            )
+            for j in range(options['exports']):
+                StandingsSheetExport.objects.create(
+                    standings=standings,
+                    name='Export {}'.format(j + 1),
+                    sheet_id=standings.label,
+                    tab='Tab{}'.format(j + 1),
+                    include_penalty=j % 2 == 1,
+                    calculate_mark=options['calculate_mark'],
+                )
+        contest_ids.extend(Contest.objects.filter(course=course).values_list('id', flat=True))
+
+        forms = []
+        for i in range(options['forms']):
+            form = create_form('{}_form{}'.format(label, i + 1), options['entries'])
+            forms.append(form)
+            FormSheetsExport.objects.create(form=form, sheet_id=form.label, tab='Form')
+
+        service = FakeSheetsService(options['quota'], options['latency'])
+        set_api_quota(options['quota'])
+        standings_exports = StandingsSheetExport.objects.filter(standings__course=course)
+        forms_exports = FormSheetsExport.objects.filter(form__in=forms)
+
+        # second sync shows cost of sync without changes
+        for name in ['first sync', 'second sync']:
+            requests = len(service.requests)
+            updated_cells = service.updated_cells
+            start = time.time()
+            run_sync(get_sync_tasks(standings_exports, forms_exports, lambda: service), options['workers'], connection)
+            print('{}: {:.2f}s, {} calls, {} cells, {} rejected by quota'.format(
+                name,
+                time.time() - start,
+                len(service.requests) - requests,
+                service.updated_cells - updated_cells,
+                service.rejected,
+            ))
+
+        if options['dump']:
+            export = standings_exports.order_by('id').first()
+            if export is not None:
+                for row in service.dump(export.sheet_id, export.tab):
+                    print('\t'.join(str(value) for value in row))
@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from algocode import settings
+from courses.lib.codeforces.replay import Fixtures, make_server
+
+
+class Command(BaseCommand):
+    help = 'Serves recorded codeforces api responses, use it with load_codeforces --api-url http://host:port/api'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            default=os.path.join(settings.BASE_DIR, 'judges_data', 'CF_fixtures'),
+            help='Directory with recorded responses, <contest id>/standings.json and <contest id>/status.json',
+        )
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Delay in seconds before every response',
+        )
+        parser.add_argument(
+            '--calls-per-second',
+            type=float,
+            default=None,
+            help='Answer "Call limit exceeded" to calls above this rate',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0,
+            help='Probability to answer "Call limit exceeded" to any call',
+        )
+        parser.add_argument(
+            '--synthetic',
+            nargs=3,
+            type=int,
+            default=None,
+            metavar=('SUBMISSIONS', 'PARTICIPANTS', 'PROBLEMS'),
+            help='Generate contests without recorded responses',
+        )
+        parser.add_argument(
+            '--record',
+            default=None,
+            metavar='UPSTREAM_URL',
+            help='Pass calls to upstream api (e.g. http://codeforces.com/api) and record responses',
+        )
+
+    def handle(self, *args, **options):
+        fixtures = Fixtures(options['fixtures'], options['synthetic'])
+        server = make_server(
+            options['host'],
+            options['port'],
+            fixtures,
+            latency=options['latency'],
+            calls_per_second=options['calls_per_second'],
+            error_rate=options['error_rate'],
+            upstream=options['record'],
+        )
+        print('Serving codeforces api at http://{}:{}/api'.format(options['host'], options['port']))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -5,54 +5,219 @@ import random
 import hashlib
 import requests
 import json
+import ijson
 import os
+import queue
+import threading
 
 from django.core.management.base import BaseCommand
+from django.db import transaction, connections
 
 from algocode import settings
 from courses.models import Contest, Participant, ContestStandingsHolder
 from courses.judges.common_verdicts import *
-from courses.lib.mongo import mongo
+from courses.lib.ratelimit.token_bucket import TokenBucket
+from courses.lib.store import store
+from courses.lib.store.lock import contests_lock
 
-CODEFORCES_API_DELAY = 0.5
+# codeforces allows one api call per two seconds
+CODEFORCES_API_DELAY = 2
+CODEFORCES_STATUS_PAGE_SIZE = 10000
+PARTICIPANTS_BULK_SIZE = 1000
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# "Call limit exceeded" is retried with the same key, delay is doubled after every attempt
+CALL_LIMIT_RETRIES = 5
+CALL_LIMIT_DELAY = 2
+# unreferenced responses newer than this may belong to load of another process that has not saved its refs yet
+RESPONSE_GC_MIN_AGE = 60 * 60
 
+# participants import of user_load is not safe to run in parallel (groups are shared between contests)
+_user_load_lock = threading.Lock()
+
+
+def is_final_submit(submit):
+    return 'verdict' in submit and submit['verdict'] != CODEFORCES_RU
+
+
+def get_load_stats(contest_info, changed, submissions):
+    contest_info = contest_info or dict()
+    return {
+        'changed': changed,
+        'submissions': submissions,
+        'phase': contest_info.get('phase'),
+        'start': contest_info.get('startTimeSeconds'),
+        'duration': contest_info.get('durationSeconds'),
+    }
+
+
+def get_handle_users():
+    handle_users = dict()
+    for handle, user_id in Participant.objects.exclude(codeforces_handle='').values_list('codeforces_handle', 'id'):
+        handle_users.setdefault(handle.lower(), []).append(user_id)
+    return handle_users
+
+
+def get_users_fingerprint(handles, handle_users):
+    # participants of every handle with submissions in contest, stored runs are rebuilt when it changes
+    users = [[handle, sorted(handle_users.get(handle, []))] for handle in sorted(handles)]
+    return hashlib.sha256(json.dumps(users).encode('utf-8')).hexdigest()
+
+
+class CallLimitExceeded(Exception):
+    pass
 
-class CodeforcesLoader:
-    STATUS_API_METHOD = 'http://codeforces.com/api/contest.status'
-    STATUS_COMPLEX_STRING = '{}/contest.status?apiKey={}&asManager=true&contestId={}&time={}#{}'
 
-    STANDINGS_API_METHOD = 'http://codeforces.com/api/contest.standings'
-    STANDINGS_COMPLEX_STRING = '{}/contest.standings?apiKey={}&asManager=true&contestId={}&time={}#{}'
+class CachedResponse:
+    def __init__(self, path, hash):
+        self.path = path
+        self.hash = hash
 
-    def __init__(self, key, secret):
+    def check(self):
+        with open(self.path, 'rb') as response_file:
+            status = next(ijson.items(response_file, 'status'), None)
+        if status != 'OK':
+            with open(self.path, 'rb') as response_file:
+                comment = next(ijson.items(response_file, 'comment'), None)
+            if comment is not None and comment.startswith('Call limit exceeded'):
+                raise CallLimitExceeded('Codeforces api error: {}'.format(comment))
+            raise Exception('Codeforces api error: {}'.format(comment))
+        return self
+
+    def items(self, prefix):
+        # parses response file incrementally, so only current item is kept in memory
+        with open(self.path, 'rb') as response_file:
+            for item in ijson.items(response_file, prefix, use_float=True):
+                yield item
+
+
+class ResponseCache:
+    """
+    Raw api responses stored by their sha256 under objects/ and hashes of last loaded responses of contest under refs/.
+    """
+
+    def __init__(self, data_dir):
+        self.objects_dir = os.path.join(data_dir, 'objects')
+        self.refs_dir = os.path.join(data_dir, 'refs')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+
+    def get_object_path(self, hash):
+        return os.path.join(self.objects_dir, '{}.json'.format(hash))
+
+    def get_refs_path(self, contest_id):
+        return os.path.join(self.refs_dir, '{}.json'.format(contest_id))
+
+    def write_file(self, path, data):
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save_stream(self, chunks):
+        sha256 = hashlib.sha256()
+        tmp_path = os.path.join(self.objects_dir, '{}.tmp'.format(threading.get_ident()))
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                sha256.update(chunk)
+                f.write(chunk)
+        hash = sha256.hexdigest()
+        path = self.get_object_path(hash)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # object is used again, so it is not removed by garbage collection of another process
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        return CachedResponse(path, hash)
+
+    def get_refs(self, contest_id):
+        try:
+            with open(self.get_refs_path(contest_id)) as refs_file:
+                return json.load(refs_file)
+        except:
+            return dict()
+
+    def is_unchanged(self, contest_id, hashes):
+        return self.get_refs(contest_id) == hashes
+
+    def save_refs(self, contest_id, hashes):
+        self.write_file(self.get_refs_path(contest_id), json.dumps(hashes).encode('utf-8'))
+
+    def collect_garbage(self):
+        # objects may be shared by contests, so they are removed in one pass when no refs point to them
+        referenced = set()
+        for name in os.listdir(self.refs_dir):
+            if name.endswith('.json'):
+                referenced.update(self.get_refs(name[:-len('.json')]).values())
+        min_mtime = time.time() - RESPONSE_GC_MIN_AGE
+        for name in os.listdir(self.objects_dir):
+            if name.endswith('.json') and name[:-len('.json')] in referenced:
+                continue
+            try:
+                path = os.path.join(self.objects_dir, name)
+                if os.path.getmtime(path) < min_mtime:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class CodeforcesLoader:
+    API_URL = 'http://codeforces.com/api'
+    STATUS_METHOD = 'contest.status'
+    STANDINGS_METHOD = 'contest.standings'
+
+    def __init__(self, key, secret, data_dir, api_url=None):
         self.key = key
         self.secret = secret
+        self.api_url = api_url or self.API_URL
+        self.limiter = TokenBucket(1 / CODEFORCES_API_DELAY)
+        self.session = requests.Session()
+        self.responses = ResponseCache(data_dir)
+
+    def get_response(self, method, params):
+        # returns checked response, call limit errors are retried before giving up
+        for attempt in range(CALL_LIMIT_RETRIES):
+            try:
+                return self.get_unchecked_response(method, params).check()
+            except CallLimitExceeded:
+                if attempt + 1 == CALL_LIMIT_RETRIES:
+                    raise
+                time.sleep(CALL_LIMIT_DELAY * 2 ** attempt)
+
+    def get_unchecked_response(self, method, params):
+        self.limiter.acquire()
 
-    def get_json(self, contest_id, api_method, api_complex_string):
         rand = 'aaaaaa'
-        cur_time = int(time.time())
-        complex_string = api_complex_string.format(rand, self.key, contest_id, cur_time, self.secret)
+        params = dict(params)
+        params['apiKey'] = self.key
+        params['asManager'] = 'true'
+        params['time'] = int(time.time())
 
+        complex_string = '{}/{}?{}#{}'.format(
+            rand,
+            method,
+            '&'.join('{}={}'.format(key, value) for key, value in sorted((key, str(value)) for key, value in params.items())),
+            self.secret
+        )
         hash = hashlib.sha512(complex_string.encode('utf-8')).hexdigest()
+        params['apiSig'] = rand + hash
 
-        response = requests.get(api_method,
-                                params={
-                                    'contestId': contest_id,
-                                    'apiKey': self.key,
-                                    'asManager': "true",
-                                    'time': cur_time,
-                                    'apiSig': rand + hash
-                                })
-        return json.loads(response.text)
+        with self.session.get('{}/{}'.format(self.api_url, method), params=params, stream=True) as response:
+            return self.responses.save_stream(response.iter_content(RESPONSE_CHUNK_SIZE))
 
-    def get_data(self, contest):
-        standings_json_values = self.get_json(contest.contest_id, self.STANDINGS_API_METHOD, self.STANDINGS_COMPLEX_STRING)
-        last_query = time.time()
+    def get_status_page(self, contest, first):
+        return self.get_response(self.STATUS_METHOD, {
+            'contestId': contest.contest_id,
+            'from': first,
+            'count': CODEFORCES_STATUS_PAGE_SIZE,
+        })
+
+    def get_problems(self, contest, standings_response):
 
         num_problems = 0
         problems = []
 
-        for problem_descriptor in standings_json_values['result']['problems']:
+        for problem_descriptor in standings_response.items('result.problems.item'):
             num_problems += 1
             problems.append({
                 'id': num_problems,
@@ -61,12 +226,18 @@ class CodeforcesLoader:
                 'index': num_problems - 1,
             })
 
-        for user_load in contest.user_load.all():
+        with _user_load_lock:
+            self.load_participants(contest, standings_response)
+
+        return problems
+
+    def load_participants(self, contest, standings_response):
+        for user_load in contest.user_load.select_related('group__course'):
             group = user_load.group
-            group_participants = group.participants.all()
-            handles = {participant.codeforces_handle for participant in group_participants}
+            handles = {handle.lower() for handle in group.participants.values_list('codeforces_handle', flat=True)}
+            new_participants = []
 
-            for row in standings_json_values['result']['rows']:
+            for row in standings_response.items('result.rows.item'):
                 try:
                     handle = row["party"]["members"][0]['handle']
                     name = handle
@@ -76,72 +247,258 @@ class CodeforcesLoader:
                         continue
                     handle_lower = handle.lower()
                     if handle_lower not in handles:
-                        Participant.objects.create(
+                        # bulk_create skips pre_save signals, so participant is created as auto_fix_participant would fix it
+                        new_participants.append(Participant(
                             name=name,
                             group=group,
                             course=group.course,
                             codeforces_handle=handle_lower,
-                        )
+                        ))
                         handles.add(handle_lower)
                 except:
                     pass
 
-        problem_index = {problem['short']: problem['index'] for problem in problems}
-
-        while time.time() - last_query < CODEFORCES_API_DELAY:
-            time.sleep(0.01)
+            if len(new_participants) > 0:
+                with transaction.atomic():
+                    Participant.objects.bulk_create(new_participants, batch_size=PARTICIPANTS_BULK_SIZE)
 
-        status_json_values = self.get_json(contest.contest_id, self.STATUS_API_METHOD, self.STATUS_COMPLEX_STRING)
-        runs_list = []
+    def get_submissions(self, contest, watermark, first_response, problem_index, handle_users, handles):
+        # contest.status returns newest submissions first, so pages are loaded until watermark is reached
+        # every submission is converted to runs while parsing, result is sorted list of (id, is final, runs)
+        # handles of loaded submissions are added to handles
+        submissions = []
+        loaded_ids = set()
+        first = 1
+        response = first_response
+        while True:
+            if response is None:
+                response = self.get_status_page(contest, first)
 
-        for submit in status_json_values['result']:
-            if 'teamId' not in submit['author']:
+            page_size = 0
+            reached_watermark = False
+            for submit in response.items('result.item'):
+                page_size += 1
+                if submit['id'] <= watermark:
+                    reached_watermark = True
+                    break
+                if submit['id'] in loaded_ids:
+                    continue
+                loaded_ids.add(submit['id'])
                 try:
-                    handle = submit['author']['members'][0]['handle'].lower()
-                    user_ids = Participant.objects.filter(codeforces_handle=handle)
-                    status = CODEFORCES_EJUDGE_VERDICTS[submit['verdict']]
-                    time_msk = datetime.datetime.fromtimestamp(submit['creationTimeSeconds'])
-                    if 'startTimeSeconds' in submit['author']:
-                        start_time = datetime.datetime.fromtimestamp(submit['author']['startTimeSeconds'])
-                    else:
-                        start_time = datetime.datetime.fromtimestamp(0)
-                    submit_time = int((time_msk - start_time).total_seconds())
-                    time_msk = pytz.timezone(settings.TIME_ZONE).localize(time_msk)
-                    utc_time = time_msk.astimezone(pytz.timezone('UTC'))
-                    prob_id = problem_index[submit['problem']['index']]
-                    score = 0
-                    if 'points' in submit:
-                        if contest.contest_type == contest.ACM:
-                            score = submit['points'] / 100
-                        else:
-                            score = submit['points']
-                    elif status == EJUDGE_OK:
-                        score = 1
-                    for cur_user in user_ids:
-                        user_id = cur_user.id
-                        runs_list.append({
-                            'user_id': user_id,
-                            'status': status,
-                            'time': submit_time,
-                            'utc_time': int(utc_time.timestamp()),
-                            'prob_id': prob_id,
-                            'score': score,
-                        })
+                    handles.add(submit['author']['members'][0]['handle'].lower())
                 except:
                     pass
+                submissions.append((
+                    submit['id'],
+                    is_final_submit(submit),
+                    self.get_submit_runs(contest, submit, problem_index, handle_users)
+                ))
 
-        return [problems, runs_list[::-1]]
+            if reached_watermark or page_size < CODEFORCES_STATUS_PAGE_SIZE:
+                break
+            first += CODEFORCES_STATUS_PAGE_SIZE
+            response = None
+
+        submissions.sort(key=lambda submission: submission[0])
+        return submissions
+
+    def get_submit_runs(self, contest, submit, problem_index, handle_users):
+        runs_list = []
+        if 'teamId' not in submit['author']:
+            try:
+                handle = submit['author']['members'][0]['handle'].lower()
+                user_ids = handle_users.get(handle, [])
+                status = CODEFORCES_EJUDGE_VERDICTS[submit['verdict']]
+                time_msk = datetime.datetime.fromtimestamp(submit['creationTimeSeconds'])
+                if 'startTimeSeconds' in submit['author']:
+                    start_time = datetime.datetime.fromtimestamp(submit['author']['startTimeSeconds'])
+                else:
+                    start_time = datetime.datetime.fromtimestamp(0)
+                submit_time = int((time_msk - start_time).total_seconds())
+                time_msk = pytz.timezone(settings.TIME_ZONE).localize(time_msk)
+                utc_time = time_msk.astimezone(pytz.timezone('UTC'))
+                prob_id = problem_index[submit['problem']['index']]
+                score = 0
+                if 'points' in submit:
+                    if contest.contest_type == contest.ACM:
+                        score = submit['points'] / 100
+                    else:
+                        score = submit['points']
+                elif status == EJUDGE_OK:
+                    score = 1
+                for user_id in user_ids:
+                    runs_list.append({
+                        'user_id': user_id,
+                        'status': status,
+                        'time': submit_time,
+                        'utc_time': int(utc_time.timestamp()),
+                        'prob_id': prob_id,
+                        'score': score,
+                    })
+            except:
+                pass
+        return runs_list
+
+    def load(self, contest, full=False):
+        # returns None if contest can't be loaded with this api key, otherwise stats for scheduling
+        with contests_lock([contest.id]):
+            return self.load_contest(contest, full)
+
+    def load_contest(self, contest, full=False):
+        standings_response = self.get_response(self.STANDINGS_METHOD, {'contestId': contest.contest_id})
+        status_response = self.get_status_page(contest, 1)
+        contest_info = next(standings_response.items('result.contest'), None)
+        hashes = {
+            self.STANDINGS_METHOD: standings_response.hash,
+            self.STATUS_METHOD: status_response.hash,
+        }
+        phase = (contest_info or dict()).get('phase')
+        cached = store.load_cache(contest.id, cached=False) if store.store_enabled() else dict()
+        handles = set(cached.get("cf_handles", []))
+        if not full and self.responses.is_unchanged(contest.id, hashes) and \
+                cached.get("cf_users") == get_users_fingerprint(handles, get_handle_users()):
+            return get_load_stats(contest_info, False, 0)
+
+        problems = self.get_problems(contest, standings_response)
+        if len(problems) == 0:
+            return None
+        problem_index = {problem['short']: problem['index'] for problem in problems}
+
+        # participants may be added by get_problems, so handles are resolved after it
+        handle_users = get_handle_users()
+        # runs below watermark are built with participants and verdicts of the time they were loaded,
+        # so everything is loaded again when participants of contest handles or contest phase (system tests) change
+        if full or cached.get("cf_problems") != problems or cached.get("cf_phase") != phase or \
+                cached.get("cf_users") != get_users_fingerprint(handles, handle_users):
+            cached = dict()
+            handles = set()
+        watermark = cached.get("cf_watermark", 0)
+
+        submissions = self.get_submissions(contest, watermark, status_response, problem_index, handle_users, handles)
+
+        # submissions that are still testing will be loaded again, so runs after them are stored as provisional
+        pending = [submit_id for submit_id, is_final, runs in submissions if not is_final]
+        if len(pending) > 0:
+            new_watermark = min(pending) - 1
+        elif len(submissions) > 0:
+            new_watermark = submissions[-1][0]
+        else:
+            new_watermark = watermark
+
+        final_runs = []
+        provisional_runs = []
+        for submit_id, is_final, runs in submissions:
+            if submit_id <= new_watermark:
+                final_runs.extend(runs)
+            else:
+                provisional_runs.extend(runs)
+
+        provisional = cached.get("cf_provisional", 0)
+        if watermark == 0:
+            if not upload_standings(contest, problems, final_runs + provisional_runs):
+                return get_load_stats(contest_info, True, len(submissions))
+        elif provisional == 0:
+            if len(final_runs) + len(provisional_runs) > 0 and not store.append_runs(contest, final_runs + provisional_runs):
+                return self.load_contest(contest, full=True)
+        else:
+            stored_problems, stored_runs = store.load_standings(contest.id, cached=False)
+            # standings were replaced since previous load, provisional runs can not be cut off
+            if len(stored_problems) == 0 or len(stored_runs) < provisional:
+                return self.load_contest(contest, full=True)
+            stored_runs = stored_runs[:len(stored_runs) - provisional]
+            if not upload_standings(contest, problems, stored_runs + final_runs + provisional_runs):
+                return get_load_stats(contest_info, True, len(submissions))
+
+        store.upload_cache(contest, {
+            "cf_problems": problems,
+            "cf_watermark": new_watermark,
+            "cf_provisional": len(provisional_runs),
+            "cf_phase": phase,
+            "cf_handles": sorted(handles),
+            "cf_users": get_users_fingerprint(handles, handle_users),
+        })
+        self.responses.save_refs(contest.id, hashes)
+        return get_load_stats(contest_info, True, len(submissions))
 
 
 def upload_standings(contest, problems, runs_list):
-    if not mongo.upload_standings(contest, [problems, runs_list]):
+    if store.upload_standings(contest, [problems, runs_list]):
+        return True
+    try:
+        standings_holder = contest.standings_holder.get()
+    except:
+        standings_holder = ContestStandingsHolder(contest=contest)
+    standings_holder.problems = json.dumps(problems)
+    standings_holder.runs_list = json.dumps(runs_list)
+    standings_holder.save()
+    return False
+
+
+def load_contests(loaders, contests, full=False):
+    # every api key has its own worker, contest that failed with one key is passed to the next one
+    # returns load stats by contest id, None for contests that failed with every key
+    contests = list(contests)
+    results = dict()
+    if len(contests) == 0 or len(loaders) == 0:
+        return results
+
+    queues = [queue.Queue() for _ in loaders]
+    remaining = [len(contests)]
+    remaining_lock = threading.Lock()
+
+    for i, contest in enumerate(contests):
+        queues[i % len(loaders)].put((contest, 0))
+
+    def finish_contest():
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                for contests_queue in queues:
+                    contests_queue.put(None)
+
+    def worker(loader_id):
         try:
-            standings_holder = contest.standings_holder.get()
-        except:
-            standings_holder = ContestStandingsHolder(contest=contest)
-        standings_holder.problems = json.dumps(problems)
-        standings_holder.runs_list = json.dumps(runs_list)
-        standings_holder.save()
+            while True:
+                item = queues[loader_id].get()
+                if item is None:
+                    return
+                contest, tried = item
+
+                print("loading ", contest.contest_id)
+                stats = None
+                try:
+                    stats = loaders[loader_id].load(contest, full)
+                    if stats is not None:
+                        print('success', contest.contest_id)
+                except Exception as e:
+                    print('Error, contest {}'.format(contest.contest_id))
+                    print(e)
+
+                results[contest.id] = stats
+                if stats is not None or tried + 1 == len(loaders):
+                    finish_contest()
+                else:
+                    queues[(loader_id + 1) % len(loaders)].put((contest, tried + 1))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(loader_id,)) for loader_id in range(len(loaders))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # responses of failed, skipped and replaced loads are not referenced by any contest
+    loaders[0].responses.collect_garbage()
+    return results
+
+
+def get_loaders(api_url=None):
+    data_dir = os.path.join(settings.BASE_DIR, 'judges_data', Contest.CODEFORCES)
+    os.makedirs(data_dir, exist_ok=True)
+    return [
+        CodeforcesLoader(api_info["key"], api_info["secret"], data_dir, api_url)
+        for api_info in settings.CODEFORCES
+    ]
 
 
 class Command(BaseCommand):
@@ -164,11 +521,19 @@ class Command(BaseCommand):
             action='store_true',
             help='Import contests for last half year',
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reload all submissions instead of only new ones (to apply rejudges or new participants)',
+        )
+        parser.add_argument(
+            '--api-url',
+            default=None,
+            help='Load from another codeforces api address (e.g. codeforces_replay_server)',
+        )
 
     def handle(self, *args, **options):
-        loaders = []
-        for api_info in settings.CODEFORCES:
-            loaders.append(CodeforcesLoader(api_info["key"], api_info["secret"]))
+        loaders = get_loaders(options['api_url'])
 
         if options['today']:
             date_start = datetime.datetime.now() - datetime.timedelta(days=4)
@@ -182,25 +547,6 @@ class Command(BaseCommand):
             date_start = datetime.datetime.now() - datetime.timedelta(days=31)
             contests = Contest.objects.filter(judge=Contest.CODEFORCES, date__gte=date_start)
 
-        data_dir = os.path.join(settings.BASE_DIR, 'judges_data', Contest.CODEFORCES)
-        os.makedirs(data_dir, exist_ok=True)
-
-        last_query = 0
-        for contest in contests:
-            print("loading ", contest.contest_id)
-            for loader in loaders:
-                while time.time() - last_query < CODEFORCES_API_DELAY * 6:
-                    time.sleep(0.01)
-                last_query = time.time()
-                try:
-                    problems, runs_list = loader.get_data(contest)
-                    if len(problems) == 0:
-                        continue
-                    upload_standings(contest, problems, runs_list)
-                    print('success')
-                    break
-                except Exception as e:
-                    print('Error, contest {}'.format(contest.contest_id))
-                    print(e)
+        load_contests(loaders, contests, options['full'])
 
         print('Codeforces loaded!')
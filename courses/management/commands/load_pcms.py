@@ -1,25 +1,170 @@
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from django.core.management.base import BaseCommand
+from django.db import connections
 
-from courses.lib.mongo import mongo
+from courses.lib.store import store
+from courses.lib.store.lock import contests_lock
 from courses.models import Contest
 from courses.judges import pcms
 
+# login to participants map, shared with worker processes once instead of sending it with every contest
+_login_users = dict()
+
+
+def get_runs_hash(runs_list):
+    return hashlib.sha256(json.dumps(runs_list, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_users_fingerprint(logins, login_users):
+    # participants of every session of contest, standings are parsed again when it changes
+    users = [[login, sorted(login_users.get(login, []))] for login in sorted(logins)]
+    return hashlib.sha256(json.dumps(users).encode('utf-8')).hexdigest()
+
+
+def get_new_runs(cached, problems, sessions):
+    # returns runs added to sessions since previous load, None if standings have to be uploaded again
+    if cached.get("pcms_problems") != problems:
+        return None
+    old_sessions = cached.get("pcms_sessions", dict())
+    if any(user_login not in sessions for user_login in old_sessions):
+        return None
+
+    new_runs = []
+    for user_login, runs_list in sessions.items():
+        old_hash, old_count = old_sessions.get(user_login, [None, 0])
+        if len(runs_list) < old_count:
+            return None
+        if old_count > 0 and get_runs_hash(runs_list[:old_count]) != old_hash:
+            return None
+        new_runs.extend(runs_list[old_count:])
+    return new_runs
+
+
+def init_worker(login_users):
+    global _login_users
+    _login_users = login_users
+
+
+def parse_contest(contest, cached, full=False):
+    # runs in worker process without database access
+    # returns None for unchanged file, otherwise dict with new cache and, if file content was changed, standings
+    # file is parsed again (even unchanged) if participants of its sessions were changed
+    path = pcms.get_standings_file(contest)
+    stat = os.stat(path)
+    file_info = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+    old_file_info = cached.get("pcms_file", dict())
+    users_changed = cached.get("pcms_users") != get_users_fingerprint(cached.get("pcms_sessions", dict()), _login_users)
+    if not full and not users_changed and all(old_file_info.get(key) == value for key, value in file_info.items()):
+        return None
+
+    with open(path, 'rb') as standings_reader:
+        body = standings_reader.read()
+    file_info["hash"] = hashlib.sha256(body).hexdigest()
+    if not full and not users_changed and old_file_info.get("hash") == file_info["hash"]:
+        return {"cache": dict(cached, pcms_file=file_info)}
+
+    problems, sessions = pcms.load_pcms_sessions(contest, json.loads(body), _login_users)
+    runs_list = []
+    for session_runs in sessions.values():
+        runs_list.extend(session_runs)
+    return {
+        "problems": problems,
+        "runs_list": runs_list,
+        "new_runs": None if full else get_new_runs(cached, problems, sessions),
+        "cache": {
+            "pcms_file": file_info,
+            "pcms_problems": problems,
+            "pcms_sessions": {
+                user_login: [get_runs_hash(session_runs), len(session_runs)]
+                for user_login, session_runs in sessions.items()
+            },
+            "pcms_users": get_users_fingerprint(sessions, _login_users),
+        },
+    }
+
+
+def parse_contests(contests, caches, login_users, full=False, jobs=None):
+    # database connections must not be shared with forked workers
+    connections.close_all()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=init_worker,
+        initargs=(login_users,),
+    ) as executor:
+        futures = {
+            executor.submit(parse_contest, contest, caches.get(contest.id, dict()), full): contest
+            for contest in contests
+        }
+        for future in as_completed(futures):
+            contest = futures[future]
+            try:
+                result = future.result()
+                if result is not None:
+                    results.append((contest, result))
+            except Exception as e:
+                print("Can not update contest {}, error:".format(contest.external_group_id), e)
+    return results
+
+
+def upload_results(results):
+    contests_standings = []
+    contests_caches = []
+    for contest, result in results:
+        if "runs_list" not in result:
+            contests_caches.append((contest, result["cache"]))
+            continue
+        new_runs = result["new_runs"]
+        if new_runs is None or (len(new_runs) > 0 and not store.append_runs(contest, new_runs)):
+            contests_standings.append((contest, result))
+        else:
+            contests_caches.append((contest, result["cache"]))
+            print("loaded", contest.external_group_id)
+
+    uploaded = store.upload_standings_many([
+        (contest, [result["problems"], result["runs_list"]]) for contest, result in contests_standings
+    ])
+    if uploaded:
+        for contest, result in contests_standings:
+            contests_caches.append((contest, result["cache"]))
+            print("loaded", contest.external_group_id)
+    else:
+        print("Can not upload standings to standings store")
+
+    if len(contests_caches) > 0:
+        store.upload_caches(contests_caches)
+
 
 class Command(BaseCommand):
     help = 'Loads data for pcms standings'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reload all standings files, even unchanged ones (to apply new participants)',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=None,
+            help='Number of processes parsing standings files (number of cores by default)',
+        )
+
     def handle(self, *args, **options):
-        contests = Contest.objects.filter(judge=Contest.PCMS)
-        users = dict()
-        for contest in contests:
-            print("loading", contest.external_group_id)
-            try:
-                problems, runs_list = pcms.load_pcms_contest(contest, users)
-                if not mongo.upload_standings(contest, [problems, runs_list]):
-                    print("Can not upload standings to mongo")
-            except Exception as e:
-                print("Can not update contest, error:", e)
-            except:
-                print("Can not update contest, unknown error")
+        contests = list(Contest.objects.filter(judge=Contest.PCMS))
+        login_users = pcms.get_login_users()
+
+        # new runs are found by cache, so it must not be changed by another load until results are uploaded
+        with contests_lock([contest.id for contest in contests]):
+            caches = store.load_caches([contest.id for contest in contests]) if store.store_enabled() else dict()
+            results = parse_contests(contests, caches, login_users, options['full'], options['jobs'])
+            upload_results(results)
 
         print('PCMS loaded!')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.lib.ejudge.register import process_pending, REGISTER_BATCH_SIZE, REGISTER_MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Registers users queued by forms and register api in ejudge'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REGISTER_BATCH_SIZE)
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=REGISTER_MAX_ATTEMPTS,
+            help='Request is marked as failed after this number of failed attempts',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Keep running and check queue every INTERVAL seconds (process queue once and exit by default)',
+        )
+
+    def handle(self, *args, **options):
+        # one logged in ejudge session for every register api, kept while command is running
+        api_sessions = dict()
+        while True:
+            close_old_connections()
+            processed, registered = process_pending(api_sessions, options['batch_size'], options['max_attempts'])
+            if processed > 0:
+                print('registered {} of {} users'.format(registered, processed))
+            # full batch means there can be more pending requests
+            if processed == options['batch_size']:
+                continue
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
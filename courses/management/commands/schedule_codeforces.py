@@ -0,0 +1,142 @@
+import time
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.models import Contest
+from courses.management.commands.load_codeforces import get_loaders, load_contests
+
+# intervals (in seconds) between loads of contest inside and outside of its contest window
+ACTIVE_MIN_INTERVAL = 5
+ACTIVE_MAX_INTERVAL = 60
+IDLE_MIN_INTERVAL = 5 * 60
+IDLE_MAX_INTERVAL = 6 * 60 * 60
+# time after contest end while system tests and rejudges are expected
+CONTEST_WINDOW_GRACE = 2 * 60 * 60
+CODEFORCES_ACTIVE_PHASES = ('CODING', 'PENDING_SYSTEM_TEST', 'SYSTEM_TEST')
+# interval is chosen so that about this number of new submissions is loaded at once
+SUBMISSIONS_PER_LOAD = 10
+RATE_SMOOTHING = 0.5
+# finished contest is loaded only once in FROZEN_INTERVAL after this number of loads without changes
+FREEZE_AFTER_LOADS = 3
+# late rejudges and participants added to contest are still picked up by these checks
+FROZEN_INTERVAL = 24 * 60 * 60
+CONTESTS_REFRESH_INTERVAL = 60
+CONTESTS_PER_API_KEY = 2
+
+
+def in_contest_window(stats, now):
+    if stats['phase'] in CODEFORCES_ACTIVE_PHASES:
+        return True
+    if stats['start'] is None or stats['duration'] is None:
+        return False
+    return stats['start'] <= now <= stats['start'] + stats['duration'] + CONTEST_WINDOW_GRACE
+
+
+def get_schedule(contest, now):
+    return {
+        'contest': contest,
+        'due': now,
+        'interval': 0,
+        'rate': 0,
+        'loaded': None,
+        'unchanged': 0,
+        'frozen': False,
+    }
+
+
+def update_schedule(schedule, stats, now):
+    if stats is None:
+        # contest failed with every api key
+        schedule['interval'] = min(max(schedule['interval'] * 2, IDLE_MIN_INTERVAL), IDLE_MAX_INTERVAL)
+        schedule['due'] = now + schedule['interval']
+        return
+
+    if schedule['loaded'] is not None:
+        elapsed = max(now - schedule['loaded'], 1)
+        schedule['rate'] = RATE_SMOOTHING * stats['submissions'] / elapsed + (1 - RATE_SMOOTHING) * schedule['rate']
+    schedule['loaded'] = now
+    schedule['unchanged'] = 0 if stats['changed'] else schedule['unchanged'] + 1
+
+    if in_contest_window(stats, now):
+        min_interval, max_interval = ACTIVE_MIN_INTERVAL, ACTIVE_MAX_INTERVAL
+    else:
+        if stats['phase'] == 'FINISHED' and schedule['unchanged'] >= FREEZE_AFTER_LOADS:
+            schedule['frozen'] = True
+            schedule['interval'] = FROZEN_INTERVAL
+            schedule['due'] = now + FROZEN_INTERVAL
+            return
+        min_interval, max_interval = IDLE_MIN_INTERVAL, IDLE_MAX_INTERVAL
+    schedule['frozen'] = False
+
+    if schedule['rate'] > 0:
+        interval = SUBMISSIONS_PER_LOAD / schedule['rate']
+    else:
+        interval = schedule['interval'] * 2
+    schedule['interval'] = min(max(interval, min_interval), max_interval)
+    schedule['due'] = now + schedule['interval']
+
+
+def refresh_schedules(schedules, days, now):
+    date_start = datetime.datetime.now() - datetime.timedelta(days=days)
+    contests = Contest.objects.filter(judge=Contest.CODEFORCES, date__gte=date_start)
+    result = dict()
+    for contest in contests:
+        if contest.id in schedules:
+            result[contest.id] = schedules[contest.id]
+            result[contest.id]['contest'] = contest
+        else:
+            result[contest.id] = get_schedule(contest, now)
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Continuously loads codeforces contests, active contests are loaded more often'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=31,
+            help='Schedule contests for this number of last days',
+        )
+        parser.add_argument(
+            '--api-url',
+            default=None,
+            help='Load from another codeforces api address (e.g. codeforces_replay_server)',
+        )
+
+    def handle(self, *args, **options):
+        loaders = get_loaders(options['api_url'])
+        if len(loaders) == 0:
+            print('No codeforces api keys')
+            return
+
+        schedules = dict()
+        next_refresh = 0
+        while True:
+            now = time.time()
+            if now >= next_refresh:
+                close_old_connections()
+                schedules = refresh_schedules(schedules, options['days'], now)
+                next_refresh = now + CONTESTS_REFRESH_INTERVAL
+
+            waiting = list(schedules.values())
+            due = sorted(
+                [schedule for schedule in waiting if schedule['due'] <= now],
+                key=lambda schedule: schedule['due']
+            )[:len(loaders) * CONTESTS_PER_API_KEY]
+
+            if len(due) == 0:
+                next_time = min([schedule['due'] for schedule in waiting] + [next_refresh])
+                time.sleep(max(next_time - now, 0))
+                continue
+
+            results = load_contests(loaders, [schedule['contest'] for schedule in due])
+            now = time.time()
+            for schedule in due:
+                was_frozen = schedule['frozen']
+                update_schedule(schedule, results.get(schedule['contest'].id), now)
+                if schedule['frozen'] != was_frozen:
+                    print('frozen' if schedule['frozen'] else 'unfrozen', schedule['contest'].contest_id)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.lib.mail.outbox import send_pending, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Sends mails queued by forms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=OUTBOX_MAX_ATTEMPTS,
+            help='Mail is marked as failed after this number of failed attempts',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Keep running and check outbox every INTERVAL seconds (send once and exit by default)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            processed, sent = send_pending(options['batch_size'], options['max_attempts'])
+            if processed > 0:
+                print('sent {} of {} mails'.format(sent, processed))
+            # full batch means there can be more pending mails
+            if processed == options['batch_size']:
+                continue
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -1,98 +1,240 @@
 import time
+import json
+import random
+import hashlib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS
 
 from algocode import settings
 from courses.lib.form.table import get_form_columns, get_form_entry_row
+from courses.lib.marks.marks import calc_marks, close_pool
+from courses.lib.ratelimit.token_bucket import TokenBucket
+from courses.lib.sheets.service import GoogleSheetsService, SheetsTemporaryError
 from courses.lib.standings.standings_data import get_standings_data
 from courses.models import StandingsSheetExport, FormSheetsExport
 
-from apiclient import discovery
-from google.oauth2 import service_account
+# sheets api allows 60 write requests per minute
+SHEETS_API_QUOTA = 60
+SHEETS_API_RETRIES = 5
+SHEETS_API_BACKOFF = 2
+SHEETS_WORKERS = 4
+# form entries are pushed by chunks, so big forms don't exceed request size limit
+FORM_EXPORT_CHUNK_SIZE = 1000
 
-SHEETS_API_DELAY = 1
-SHEETS_SCOPES = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/spreadsheets"]
+_limiter = TokenBucket(SHEETS_API_QUOTA / 60)
+_local = threading.local()
+
+
+def set_api_quota(quota):
+    global _limiter
+    _limiter = TokenBucket(quota / 60)
+
+
+def get_service():
+    # api client is not thread safe, so every worker has its own
+    service = getattr(_local, 'service', None)
+    if service is None:
+        service = GoogleSheetsService(settings.GOOGLE_SHEETS_CONFIG)
+        _local.service = service
+    return service
+
+
+def batch_update(service, spreadsheet_id, data):
+    # every api call waits for quota, calls rejected because of quota are retried with exponential backoff
+    for attempt in range(SHEETS_API_RETRIES):
+        _limiter.acquire()
+        try:
+            return service.batch_update(spreadsheet_id, data)
+        except SheetsTemporaryError:
+            if attempt + 1 == SHEETS_API_RETRIES:
+                raise
+            time.sleep(SHEETS_API_BACKOFF * 2 ** attempt + random.random())
+
+
+def sync_standings(exports, get_service, force=False):
+    standings = exports[0].standings
+    try:
+        standings_data = get_standings_data(standings)
+    except Exception as e:
+        print("Error while computing standings", standings.title, standings.label)
+        print(e)
+        return
+
+    for export in exports:
+        try:
+            export_contest(export, get_service(), force, standings_data)
+            print("Updated standings", export.id, export.name, export.standings.title, export.standings.label)
+        except Exception as e:
+            print("Error while updating", export.id, export.name, export.standings.title, export.standings.label)
+            print(e)
+
+
+def sync_forms(exports, get_service):
+    form = exports[0].form
+    try:
+        form_columns = get_form_columns(form)
+    except Exception as e:
+        print("Error while getting form columns", form.label, form.title)
+        print(e)
+        return
+
+    for export in exports:
+        try:
+            export_form(export, get_service(), form_columns)
+            print("Exported form", export.id, export.name, export.form.label, export.form.title)
+        except Exception as e:
+            print("Error while updations", export.id, export.name, export.form.label, export.form.title)
+            print(e)
+
+
+def get_sync_tasks(standings_exports, forms_exports, get_service, force=False):
+    tasks = []
+    # exports of the same standings are done by one task, so standings data is computed once for all of them
+    standings_exports = standings_exports.select_related('standings').order_by('standings_id', 'id')
+    for standings_id, exports in itertools.groupby(standings_exports, key=lambda export: export.standings_id):
+        tasks.append((sync_standings, (list(exports), get_service, force)))
+
+    # the same for form columns
+    forms_exports = forms_exports.select_related('form').order_by('form_id', 'id')
+    for form_id, exports in itertools.groupby(forms_exports, key=lambda export: export.form_id):
+        tasks.append((sync_forms, (list(exports), get_service)))
+    return tasks
+
+
+def run_sync(tasks, workers=SHEETS_WORKERS, connection=None):
+    # tasks are (function, args), database connections are opened by every worker thread and closed after task,
+    # if connection is given (with thread sharing enabled), it is used by all workers and is not closed
+    def run(task):
+        func, args = task
+        if connection is not None:
+            connections[DEFAULT_DB_ALIAS] = connection
+            func(*args)
+            return
+        try:
+            func(*args)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(run, tasks):
+            pass
 
 
 class Command(BaseCommand):
     help = 'Loads data from codeforces'
 
-    def handle(self, *args, **options):
-
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Push whole standings, even unchanged rows (if sheets were edited by hand)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=SHEETS_WORKERS,
+            help='Number of exports done at the same time, api calls are limited by quota anyway',
+        )
 
+    def handle(self, *args, **options):
         try:
-            credentials = service_account.Credentials.from_service_account_info(settings.GOOGLE_SHEETS_CONFIG, scopes=SHEETS_SCOPES)
-            service = discovery.build('sheets', 'v4', credentials=credentials)
+            get_service()
         except Exception as e:
             print("Error while connecting to sheets api")
             print(e)
             return
 
-        exports = StandingsSheetExport.objects.all()
-
-        for export in exports:
-            try:
-                export_contest(export, service)
-                print("Updated standings", export.id, export.name, export.standings.title, export.standings.label)
-            except Exception as e:
-                print("Error while updating", export.id, export.name, export.standings.title, export.standings.label)
-                print(e)
-            time.sleep(SHEETS_API_DELAY)
-
-        forms_exports = FormSheetsExport.objects.filter(do_update=True)
-        for export in forms_exports:
-            try:
-                export_form(export, service)
-                print("Exported form", export.id, export.name, export.form.label, export.form.title)
-            except Exception as e:
-                print("Error while updations", export.id, export.name, export.form.label, export.form.title)
-                print(e)
-            time.sleep(SHEETS_API_DELAY)
+        tasks = get_sync_tasks(
+            StandingsSheetExport.objects.all(),
+            FormSheetsExport.objects.filter(do_update=True),
+            get_service,
+            options['force'],
+        )
+        try:
+            run_sync(tasks, options['workers'])
+        finally:
+            close_pool()
 
         print('sheets synced!')
 
 
-def export_form(export: FormSheetsExport, service):
-    entries = list(export.form.entries.filter(id__gt=export.latest_id).order_by("id"))
-    if len(entries) == 0:
-        return
-
-    columns, column_names = get_form_columns(export.form)
+def export_form(export: FormSheetsExport, service, form_columns=None):
+    # entries are pushed by chunks, position is saved after every chunk, so failed export continues from it
+    if form_columns is None:
+        form_columns = get_form_columns(export.form)
+    columns, column_names = form_columns
 
     column_id = get_column_id(len(columns))
 
-    data = [dict(), dict()]
-    data[0]["range"] = "{}!A1:{}1".format(
-        export.tab,
-        column_id,
-    )
-    data[0]["values"] = [columns]
+    first_chunk = True
+    while True:
+        # every chunk is a separate query, no cursor is open while sheet and position are written
+        chunk = list(export.form.entries.filter(id__gt=export.latest_id).order_by("id")[:FORM_EXPORT_CHUNK_SIZE])
+        if len(chunk) == 0:
+            return
+
+        data = []
+        if first_chunk:
+            data.append({
+                "range": "{}!A1:{}1".format(export.tab, column_id),
+                "values": [columns],
+            })
+            first_chunk = False
 
-    data[1]["range"] = "{}!A{}:{}{}".format(
-        export.tab,
-        export.latest_row + 1,
-        column_id,
-        export.latest_row + len(entries)
-    )
-    data[1]["values"] = [get_form_entry_row(entry, column_names) for entry in entries]
+        data.append({
+            "range": "{}!A{}:{}{}".format(
+                export.tab,
+                export.latest_row + 1,
+                column_id,
+                export.latest_row + len(chunk)
+            ),
+            "values": [get_form_entry_row(entry, column_names) for entry in chunk],
+        })
 
-    xx = service.spreadsheets().values().batchUpdate(
-        spreadsheetId=export.sheet_id,
-        body={
-            "valueInputOption": 'USER_ENTERED',
-            "data": data,
-        }
-    ).execute()
+        xx = batch_update(service, export.sheet_id, data)
 
-    export.latest_row += len(entries)
-    export.latest_id = entries[-1].id
-    export.save()
+        export.latest_row += len(chunk)
+        export.latest_id = chunk[-1].id
+        export.save(update_fields=['latest_id', 'latest_row'])
 
 
-def export_contest(export: StandingsSheetExport, service):
-    standings = export.standings
+def get_row_hash(row):
+    return hashlib.md5(json.dumps(row).encode('utf-8')).hexdigest()[:16]
 
-    users_data, contests = get_standings_data(standings)
+
+def get_changed_data(tab, column_ranges, ranges_rows, pushed_hashes):
+    # returns ranges of changed rows (consecutive rows are merged) and hashes of all rows by column range
+    data = []
+    hashes = dict()
+    for (first_column, last_column), rows in zip(column_ranges, ranges_rows):
+        key = "{}:{}".format(first_column, last_column)
+        row_hashes = [get_row_hash(row) for row in rows]
+        old_hashes = pushed_hashes.get(key, [])
+        hashes[key] = row_hashes
+
+        start = None
+        for i in range(len(rows) + 1):
+            changed = i < len(rows) and (i >= len(old_hashes) or old_hashes[i] != row_hashes[i])
+            if changed and start is None:
+                start = i
+            elif not changed and start is not None:
+                data.append({
+                    "range": "{}!{}{}:{}{}".format(tab, first_column, start + 1, last_column, i),
+                    "values": rows[start:i],
+                })
+                start = None
+    return data, hashes
+
+
+def export_contest(export: StandingsSheetExport, service, force=False, standings_data=None):
+    # standings_data is result of get_standings_data, it can be shared between exports and is not modified
+    if standings_data is None:
+        standings_data = get_standings_data(export.standings)
+    users_data, contests = standings_data
 
     column_ranges = [['A', 'C']]
 
@@ -124,6 +266,7 @@ def export_contest(export: StandingsSheetExport, service):
         problem_extra += 1
 
     calc_mark = export.calculate_mark
+    marks_batch = []
 
     for contest in contests[::-1]:
         contest_width = len(contest["problems"]) * (problem_extra + 1)
@@ -174,18 +317,31 @@ def export_contest(export: StandingsSheetExport, service):
             users[id].append(user_row)
 
         if calc_mark:
-            try:
-                ldict = {}
-                exec(export.mark_func, locals(), ldict)
-                marks = ldict["marks"]
-
-                if len(marks) != len(user_ids):
-                    marks = [0] * len(user_ids)
-            except:
+            # names mark_func could use when it was executed here
+            marks_batch.append({
+                'user_scores': user_scores,
+                'contest_info': contest_info,
+                'contest': contest,
+                'contests': contests,
+                'contest_width': contest_width,
+                'problem_extra': problem_extra,
+                'include_penalty': include_penalty,
+                'include_verdict': include_verdict,
+                'include_time': include_time,
+                'user_ids': user_ids,
+                'users_data': users_data,
+                'user_score': dict(user_score),
+            })
+
+    if calc_mark:
+        # marks of all contests are calculated by one call to worker process, failed ones are zeros
+        for contest_index, (marks, error) in enumerate(calc_marks(export.mark_func, marks_batch)):
+            if marks is None:
+                print("Can not calculate marks of export {}, contest {}, error:".format(
+                    export.id, contests[len(contests) - 1 - contest_index]["title"]), error)
                 marks = [0] * len(user_ids)
-
             for i, id in enumerate(user_ids):
-                users[id][-1].append(marks[i])
+                users[id][contest_index + 1].append(marks[i])
 
     users_list = []
 
@@ -196,25 +352,27 @@ def export_contest(export: StandingsSheetExport, service):
         users_list.append(users[id])
     users_list.sort(key=lambda a: (a[0][1], a[0][0]))
 
-    data = []
+    ranges_rows = []
     for i in range(len(column_ranges)):
-        data.append(dict())
-        data[-1]["range"] = "{}!{}1:{}{}".format(
-            export.tab,
-            column_ranges[i][0],
-            column_ranges[i][1],
-            len(users_list) + 2
-        )
-        data[-1]["values"] = [header[0][i], header[1][i]]
-        data[-1]["values"] += [users_list[j][i] for j in range(len(users_list))]
-
-    xx = service.spreadsheets().values().batchUpdate(
-        spreadsheetId=export.sheet_id,
-        body={
-            "valueInputOption": 'USER_ENTERED',
-            "data": data,
-        }
-    ).execute()
+        ranges_rows.append([header[0][i], header[1][i]])
+        ranges_rows[-1] += [users_list[j][i] for j in range(len(users_list))]
+
+    try:
+        last_pushed = json.loads(export.last_pushed)
+    except:
+        last_pushed = dict()
+    pushed_hashes = dict()
+    if not force and last_pushed.get("sheet_id") == export.sheet_id and last_pushed.get("tab") == export.tab:
+        pushed_hashes = last_pushed.get("ranges", dict())
+
+    data, hashes = get_changed_data(export.tab, column_ranges, ranges_rows, pushed_hashes)
+    if len(data) == 0:
+        return
+
+    xx = batch_update(service, export.sheet_id, data)
+
+    export.last_pushed = json.dumps({"sheet_id": export.sheet_id, "tab": export.tab, "ranges": hashes})
+    export.save(update_fields=['last_pushed'])
 
 
 def get_column_id(k):
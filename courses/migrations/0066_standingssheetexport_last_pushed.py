@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0065_contest_enable_start_time_contest_start_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='standingssheetexport',
+            name='last_pushed',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0066_standingssheetexport_last_pushed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('to', models.TextField()),
+                ('status', models.CharField(choices=[('PE', 'Pending'), ('SE', 'Sent'), ('FA', 'Failed')], db_index=True, default='PE', max_length=2)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(auto_now_add=True)),
+                ('error', models.TextField(blank=True)),
+                ('time', models.DateTimeField(auto_now_add=True)),
+                ('sent_time', models.DateTimeField(blank=True, null=True)),
+                ('entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mails', to='courses.formentry')),
+                ('mail_auth', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='courses.mailauth')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:54
+
+import courses.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0067_mailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formbuilder',
+            name='register_async',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='EjudgeRegisterRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('cf_login', models.TextField(blank=True, null=True)),
+                ('token', models.CharField(default=courses.models.get_register_token, max_length=32, unique=True)),
+                ('status', models.CharField(choices=[('PE', 'Pending'), ('DN', 'Done'), ('FA', 'Failed')], db_index=True, default='PE', max_length=2)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(auto_now_add=True)),
+                ('error', models.TextField(blank=True)),
+                ('login', models.TextField(blank=True)),
+                ('password', models.TextField(blank=True)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('time', models.DateTimeField(auto_now_add=True)),
+                ('done_time', models.DateTimeField(blank=True, null=True)),
+                ('entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='register_requests', to='courses.formentry')),
+                ('register_api', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requests', to='courses.ejudgeregisterapi')),
+            ],
+        ),
+    ]
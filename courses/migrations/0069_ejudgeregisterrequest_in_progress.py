@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0068_ejudgeregisterrequest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ejudgeregisterrequest',
+            name='status',
+            field=models.CharField(choices=[('PE', 'Pending'), ('IP', 'In progress'), ('DN', 'Done'), ('FA', 'Failed')], db_index=True, default='PE', max_length=2),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0069_ejudgeregisterrequest_in_progress'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailoutbox',
+            name='status',
+            field=models.CharField(choices=[('PE', 'Pending'), ('SN', 'Sending'), ('SE', 'Sent'), ('FA', 'Failed')], db_index=True, default='PE', max_length=2),
+        ),
+    ]
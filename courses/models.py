@@ -1,4 +1,5 @@
 import os
+import uuid
 from datetime import datetime
 
 from django.contrib.auth.models import User
@@ -30,6 +31,10 @@ def get_photo_path(instance, filename):
     return 'photos/{0}'.format(filename)
 
 
+def get_register_token():
+    return uuid.uuid4().hex
+
+
 class ContestType:
     ACM = "AC"
     OLYMP = "OL"
@@ -285,6 +290,8 @@ def calc_marks_v1(
     
 marks = calc_marks_v1(user_scores, contest_info)
 ''')
+    # hashes of rows pushed to the sheet by sync_sheets
+    last_pushed = models.TextField(blank=True)
 
 
 class BlitzProblem(models.Model):
@@ -349,6 +356,8 @@ class FormBuilder(models.Model):
 
     register_api = models.ManyToManyField(EjudgeRegisterApi, related_name="forms", blank=True)
     register_name_template = models.TextField(blank=True)
+    # register in ejudge by process_ejudge_registrations command, user is redirected to status page
+    register_async = models.BooleanField(default=False)
 
 
 class FormFieldType:
@@ -409,6 +418,65 @@ class FormEntry(models.Model):
     time = models.DateTimeField(auto_now_add=True)
 
 
+class MailOutbox(models.Model):
+    # mails are sent by send_mail_outbox command, not inside request
+    # next_attempt of mail being sent is time when it can be taken by another sender
+    PENDING = "PE"
+    SENDING = "SN"
+    SENT = "SE"
+    FAILED = "FA"
+
+    STATUSES = (
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    mail_auth = models.ForeignKey(MailAuth, related_name="outbox", on_delete=models.CASCADE)
+    entry = models.ForeignKey(FormEntry, related_name="mails", blank=True, on_delete=models.SET_NULL, null=True)
+    subject = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    to = models.TextField()
+    status = models.CharField(max_length=2, choices=STATUSES, default=PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(auto_now_add=True)
+    error = models.TextField(blank=True)
+    time = models.DateTimeField(auto_now_add=True)
+    sent_time = models.DateTimeField(blank=True, null=True)
+
+
+class EjudgeRegisterRequest(models.Model):
+    # registrations done by process_ejudge_registrations command, not inside request
+    # next_attempt of request in progress is time when it can be taken by another worker
+    PENDING = "PE"
+    IN_PROGRESS = "IP"
+    DONE = "DN"
+    FAILED = "FA"
+
+    STATUSES = (
+        (PENDING, "Pending"),
+        (IN_PROGRESS, "In progress"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    register_api = models.ForeignKey(EjudgeRegisterApi, related_name="requests", on_delete=models.CASCADE)
+    entry = models.ForeignKey(FormEntry, related_name="register_requests", blank=True, on_delete=models.SET_NULL, null=True)
+    name = models.TextField()
+    cf_login = models.TextField(blank=True, null=True)
+    token = models.CharField(max_length=32, unique=True, default=get_register_token)
+    status = models.CharField(max_length=2, choices=STATUSES, default=PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(auto_now_add=True)
+    error = models.TextField(blank=True)
+    login = models.TextField(blank=True)
+    password = models.TextField(blank=True)
+    user_id = models.IntegerField(blank=True, null=True)
+    time = models.DateTimeField(auto_now_add=True)
+    done_time = models.DateTimeField(blank=True, null=True)
+
+
 class FormSheetsExport(models.Model):
     form = models.ForeignKey(FormBuilder, related_name="exports", on_delete=models.CASCADE)
     name = models.TextField(blank=True)
@@ -25,9 +25,11 @@ urlpatterns = [
     path('pole_chudes/team/guess/<int:team_id>/', PoleChudesGuessView.as_view(), name='pole_chudes_team_guess'),
     path('pole_chudes/<int:game_id>/', PoleChudesTeamsView.as_view(), name='pole_chudes'),
     path('api/ejudge_register/', EjudgeRegister.as_view(), name='ejudge_register_api'),
+    path('api/ejudge_register/<str:token>/', EjudgeRegisterStatus.as_view(), name='ejudge_register_status'),
     path('form/data/', FormDataView.as_view(), name='form_data'),
     path('form/export/json/<str:form_label>', FormJsonExport.as_view(), name='form_json_export'),
     path('form/export/csv/<str:form_label>', FormCSVExport.as_view(), name='form_csv_export'),
+    path('form/registration/<str:token>/', FormRegistrationView.as_view(), name='form_registration'),
     path('form/<str:form_label>/', FormView.as_view(), name='form'),
     path('<str:course_label>/', CourseView.as_view(), name='course'),
 ]
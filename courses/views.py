@@ -1,38 +1,48 @@
-import csv
 import datetime
 import json
 import os
-import re
 import random
 from time import sleep
 
 import pytz
 from django.contrib.auth import logout, authenticate, login
-from django.core import mail
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse, \
+    Http404
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
-from transliterate import translit
 
-from algocode.settings import EJUDGE_CONTROL, JUDGES_DIR, EJUDGE_URL, EJUDGE_AUTH, DEFAULT_MAIN, DEFAULT_COURSE, \
-    DEFAULT_PAGE
+from algocode.settings import EJUDGE_CONTROL, JUDGES_DIR, DEFAULT_MAIN, DEFAULT_COURSE, DEFAULT_PAGE
 from courses.judges.common_verdicts import EJUDGE_OK
 from courses.judges.pole_chudes import recalc_pole_chudes_standings
-from courses.lib.form.table import get_form_columns, get_form_entry_row
+from courses.lib.ejudge.register import register_user, enqueue_registration, get_registration_result
+from courses.lib.form.schema import get_form_schema
+from courses.lib.form.table import iter_form_csv, iter_form_json
+from courses.lib.mail.outbox import enqueue_mail
 from courses.lib.standings.standings_data import get_standings_data
 from courses.models import Course, Main, Standings, Page, Contest, BlitzProblem, BlitzProblemStart, EjudgeRegisterApi, \
-    Participant, Battleship, FormBuilder, FormField, FormEntry, PoleChudesTeam, PoleChudesGuess, PoleChudesGame, \
-    BattleshipShip
+    EjudgeRegisterRequest, Battleship, FormBuilder, FormField, FormEntry, PoleChudesTeam, PoleChudesGuess, \
+    PoleChudesGame, BattleshipShip
 from courses.judges.judges import load_contest
 
 from django.views import View
 
-from ejudge_registration.ejudge_api_registration import EjudgeApiSession
-
 from ipware import get_client_ip
 
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+def parse_bool(value):
+    # returns None for value that is neither true nor false
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return None
+
 
 class MainView(View):
     def get(self, request, main_id=DEFAULT_MAIN):
@@ -238,40 +248,6 @@ class BlitzMakeBid(View):
         return redirect(reverse("blitz_view", kwargs={"contest_id": problem.contest.id}))
 
 
-def register_user(ejudge_register_api: EjudgeRegisterApi, name: str, cf_login=None):
-    contests = [contest.contest_id for contest in ejudge_register_api.contests.all()]
-    login = ejudge_register_api.login
-    api_session = EjudgeApiSession(EJUDGE_AUTH["login"], EJUDGE_AUTH["password"], EJUDGE_URL)
-    int_login = True
-    if ejudge_register_api.use_surname:
-        surname = translit(name.split()[0], 'ru', reversed=True)
-        surname = re.sub(r'\W+', '', surname).lower()
-        login = f'{login}{surname}'
-        int_login = False
-    user = api_session.create_user_and_add_contests(login, name, int_login, contests)
-    for group in ejudge_register_api.groups.all():
-        group_name = name
-        if group.use_login:
-            group_name = user["login"]
-        if cf_login is None:
-            Participant.objects.create(
-                name=group_name,
-                group=group.group,
-                course=group.group.course,
-                ejudge_id=user["user_id"],
-                pcms_login=user["login"],
-            )
-        else:
-            Participant.objects.create(
-                name=group_name,
-                group=group.group,
-                course=group.group.course,
-                ejudge_id=user["user_id"],
-                codeforces_handle=cf_login
-            )
-    return user
-
-
 @method_decorator(csrf_exempt, name='dispatch')
 class EjudgeRegister(View):
     def post(self, request):
@@ -281,10 +257,31 @@ class EjudgeRegister(View):
         if secret != ejudge_register_api.secret:
             return HttpResponseBadRequest("Wrong secret")
         name = request.POST.get('name')
+        is_async = parse_bool(request.POST.get('async', ''))
+        if is_async is None:
+            return HttpResponseBadRequest("Wrong async")
+        if is_async:
+            register_request = enqueue_registration(ejudge_register_api, name)
+            return JsonResponse({
+                "status": register_request.status,
+                "token": register_request.token,
+                "status_url": request.build_absolute_uri(
+                    reverse('ejudge_register_status', kwargs={'token': register_request.token})
+                ),
+            })
         user = register_user(ejudge_register_api, name)
         return JsonResponse(user)
 
 
+class EjudgeRegisterStatus(View):
+    def get(self, request, token):
+        register_request = get_object_or_404(EjudgeRegisterRequest, token=token)
+        res = {"status": register_request.status}
+        if register_request.status == EjudgeRegisterRequest.DONE:
+            res.update(get_registration_result(register_request))
+        return JsonResponse(res)
+
+
 class BattleshipView(View):
     def get(self, request, battleship_id):
         battleship = get_object_or_404(Battleship, id=battleship_id)
@@ -299,7 +296,7 @@ class BattleshipView(View):
         users = []
         for participant in participants:
             users.append(participant.participant)
-        standings = load_contest(battleship.contest, users, required_users=users)
+        standings = load_contest(battleship.contest, users, required_users=users, user_runs=True)
         problem_names = standings["problems"]
 
         fields = [
@@ -377,7 +374,7 @@ class BattleshipAdminView(View):
                     'index': 0,
                 })
         else:
-            standings = load_contest(battleship.contest, users, required_users=users)
+            standings = load_contest(battleship.contest, users, required_users=users, user_runs=True)
             problem_names = standings["problems"]
 
         fields = [
@@ -447,39 +444,25 @@ class BattleshipAdminView(View):
 
 class FormView(View):
     def get(self, request, form_label):
-        form = get_object_or_404(FormBuilder, label=form_label)
-
-        fields = []
-
-        for field in form.fields.order_by("id"):
-            f = {
-                'id': field.id,
-                'label': field.label,
-                'type': field.type,
-                'required': field.required,
-                'internal_name': field.internal_name,
-                'description': field.description,
-            }
-            f.update(field.TYPES_DICT)
-            if field.type == FormField.SELECT:
-                f['options'] = field.select_options.order_by("id")
-            fields.append(f)
-
-        print(fields)
+        schema = get_form_schema(form_label)
+        if schema is None:
+            raise Http404("No form {}".format(form_label))
 
         return render(
             request,
             'form.html',
             {
-                'form': form,
-                'fields': fields,
+                'form': schema['form'],
+                'fields': schema['fields'],
             }
         )
 
     @method_decorator(csrf_protect)
     def post(self, request, form_label):
-        form = get_object_or_404(FormBuilder, label=form_label)
-        fields = form.fields.order_by("id")
+        schema = get_form_schema(form_label)
+        if schema is None:
+            raise Http404("No form {}".format(form_label))
+        form = schema['form']
         result = dict()
 
         user_mail = ''
@@ -493,21 +476,23 @@ class FormView(View):
             if entries >= form.requests_per_day_limit:
                 return HttpResponse("Превышенно максимальное число запросов")
 
-        for field in fields:
-            if field.type in [FormField.STR, FormField.MAIL, FormField.PHONE, FormField.LONG, FormField.DATE, FormField.SELECT]:
-                result[field.internal_name] = request.POST.get(field.internal_name, '')
-                if field.type == FormField.MAIL:
-                    user_mail = request.POST.get(field.internal_name, '')
+        for field in schema['fields']:
+            field_type = field['type']
+            internal_name = field['internal_name']
+            if field_type in [FormField.STR, FormField.MAIL, FormField.PHONE, FormField.LONG, FormField.DATE, FormField.SELECT]:
+                result[internal_name] = request.POST.get(internal_name, '')
+                if field_type == FormField.MAIL:
+                    user_mail = request.POST.get(internal_name, '')
 
-            if field.type == FormField.INTEGER:
-                result[field.internal_name] = int(request.POST.get(field.internal_name, 0))
+            if field_type == FormField.INTEGER:
+                result[internal_name] = int(request.POST.get(internal_name, 0))
 
-            if field.type == FormField.CHECKBOX:
-                result[field.internal_name] = field.internal_name in request.POST
+            if field_type == FormField.CHECKBOX:
+                result[internal_name] = internal_name in request.POST
 
-        if len(form.register_api.all()) > 0:
+        ejudge_register_api = schema['register_api']
+        if ejudge_register_api is not None and not form.register_async:
             name = form.register_name_template.format(**result)
-            ejudge_register_api = form.register_api.all()[0]
             if "cf_login" in result:
                 user_login = register_user(ejudge_register_api, name, result["cf_login"])
             else:
@@ -519,28 +504,40 @@ class FormView(View):
         entry = FormEntry.objects.create(form=form, data=json.dumps(result), mail=user_mail, ip=user_ip)
         entry.save()
 
+        if ejudge_register_api is not None and form.register_async:
+            # credentials and confirmation mail are added by process_ejudge_registrations
+            name = form.register_name_template.format(**result)
+            register_request = enqueue_registration(ejudge_register_api, name, result.get("cf_login"), entry)
+            return redirect(reverse('form_registration', kwargs={'token': register_request.token}))
+
         if form.send_mail and form.mail_auth:
-            auth = form.mail_auth
-
-            with mail.get_connection(
-                    host=auth.mail_host,
-                    port=auth.mail_port,
-                    username=auth.mail_username,
-                    password=auth.mail_password,
-                    use_tls=auth.mail_use_tls,
-                    use_ssl=auth.mail_use_ssl
-            ) as connection:
-                mail.EmailMessage(
-                    form.mail_topic,
-                    form.mail_template.format(**result),
-                    auth.mail_username,
-                    [user_mail],
-                    connection=connection
-                ).send()
+            enqueue_mail(form.mail_auth, form.mail_topic, form.mail_template.format(**result), user_mail, entry)
 
         return HttpResponse(form.response_text.format(**result))
 
 
+class FormRegistrationView(View):
+    def get(self, request, token):
+        register_request = get_object_or_404(
+            EjudgeRegisterRequest.objects.select_related('entry__form'),
+            token=token,
+            entry__isnull=False,
+        )
+        form = register_request.entry.form
+        response_text = ''
+        if register_request.status == EjudgeRegisterRequest.DONE:
+            response_text = form.response_text.format(**json.loads(register_request.entry.data))
+        return render(
+            request,
+            'form_registration.html',
+            {
+                'form': form,
+                'register_request': register_request,
+                'response_text': response_text,
+            }
+        )
+
+
 class FormDataView(View):
     def get(self, request):
         user = request.user
@@ -572,16 +569,7 @@ class FormJsonExport(View):
 
         form = get_object_or_404(FormBuilder, label=form_label)
 
-        entries = form.entries.order_by("id")
-
-        result = []
-        for entry in entries:
-            entry_dict = json.loads(entry.data)
-            entry_dict["ip"] = entry.ip
-            entry_dict["time"] = entry.time.isoformat()
-            result.append(entry_dict)
-
-        return JsonResponse(result, safe=False)
+        return StreamingHttpResponse(iter_form_json(form), content_type='application/json')
 
 
 class FormCSVExport(View):
@@ -592,22 +580,12 @@ class FormCSVExport(View):
 
         form = get_object_or_404(FormBuilder, label=form_label)
 
-        response = HttpResponse(
+        response = StreamingHttpResponse(
+            iter_form_csv(form),
             content_type='text/csv',
         )
 
         response['Content-Disposition'] = 'attachment; filename="{label}.csv"'.format(label=form.label)
-        writer = csv.writer(response)
-
-        columns, column_names = get_form_columns(form)
-
-        writer.writerow(columns)
-
-        entries = form.entries.order_by("id")
-
-        for entry in entries:
-            writer.writerow(get_form_entry_row(entry, column_names))
-
         return response
 
 
@@ -654,7 +632,7 @@ class PoleChudesTeamView(View):
         for participant in team.participants.order_by("id"):
             participants.append(participant.participant)
 
-        contest = load_contest(team.game.contest, participants, required_users=participants)
+        contest = load_contest(team.game.contest, participants, required_users=participants, user_runs=True)
         prob_letters = ["" for i in range(len(team.game.alphabet))]
 
         for i in range(len(contest["problems"])):